@@ -1,11 +1,15 @@
+import asyncio
 import streamlit as st
 import clipman
-from run import run
+from errors import WaferError
+from run import run_async
 
 st.title("Welcome to WAFER!")
 
 if "template" not in st.session_state:
     st.session_state["template"] = ""
+if "missing_reviews" not in st.session_state:
+    st.session_state["missing_reviews"] = []
 
 
 def form_callback(text):
@@ -76,6 +80,10 @@ with st.form("Form"):
 with st.container(border=True):
 
     # Initialize wiki_template with an empty string to ensure the text area is visible
+    # The warning has to survive the rerun after generating, so it's kept in the session
+    for review in st.session_state.missing_reviews:
+        st.warning(f"Review {review} did not arrive in time and was left out")
+
     st.text_area(label="Template", height=500, value=st.session_state.template)
 
 if submitted:
@@ -128,6 +136,11 @@ if submitted:
 
     album_info['classes'] = classes
 
-    wiki_template = run(album_info)
-    form_callback(wiki_template)
-    st.rerun()
+    try:
+        wiki_template, missing_reviews = asyncio.run(run_async(album_info))
+    except WaferError as e:
+        st.error(f"Could not generate the page: {e}")
+    else:
+        st.session_state.missing_reviews = missing_reviews
+        form_callback(wiki_template)
+        st.rerun()
@@ -1,14 +1,60 @@
-import requests
 import base64
 import configparser
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
 import constants as c
+import http_client
+from document import atomic_write
+from errors import ParseError
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path):
+    """Helper context manager that holds an exclusive lock on a lock file
+
+    Args:
+        path (string): Path to the lock file
+    """
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
 
 
 class Authentication:
-    def __init__(self) -> None:
-        self.header = self.create_headers()
+    def __init__(self, cache_path=c.TOKEN_CACHE_PATH) -> None:
+        # The credentials are only read once a token actually has to be requested
+        self.header = None
         self.access_token = ''
-        self.expires_in = 0
+        # Absolute expiry time of the access token as a Unix timestamp
+        self.expires_at = 0
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.timer = None
 
     def create_headers(self):
         # Read client ID and secret from config file and store them in variables
@@ -30,16 +76,91 @@ class Authentication:
 
         return headers
 
+    def is_valid(self, margin=0):
+        return bool(self.access_token) and time.time() < self.expires_at - margin
+
+    def get_access_token(self):
+        """Function that returns a valid access token, refreshing it if needed
+
+        Only one refresh runs at a time, requests arriving meanwhile wait for it and
+        then use the token it got.
+
+        Returns:
+            string: The access token
+        """
+
+        if not self.is_valid():
+            with self.lock:
+                if not self.is_valid():
+                    self.refresh_access_token()
+
+        return self.access_token
+
+    def load_cached_token(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if cached.get('expires_at', 0) <= self.expires_at:
+            return False
+
+        self.access_token = cached['access_token']
+        self.expires_at = cached['expires_at']
+        return True
+
+    def save_cached_token(self):
+        atomic_write(self.cache_path, json.dumps({'access_token': self.access_token,
+                                                  'expires_at': self.expires_at}))
+
     def refresh_access_token(self):
 
-        # Send a POST request to the API endpoint with the headers and parameters
-        response = requests.post(
-            c.URL, headers=self.header, data=c.PARAMS, timeout=(3, 5))
+        # Hold the lock file so worker processes don't all refresh at the same time
+        with file_lock(self.cache_path + '.lock'):
+            # Another process may have refreshed the token already
+            if self.load_cached_token() and self.is_valid(c.TOKEN_REFRESH_MARGIN):
+                self.schedule_refresh()
+                return
 
-        # If the response is successful, update the access token and expiration time
-        if response.status_code == 200:
-            response_data = response.json()
-            self.access_token = response_data['access_token']
-            self.expires_in = response_data.get('expires_in', 0)
-        else:
-            print('Error:', response.status_code, response.content)
+            if self.header is None:
+                self.header = self.create_headers()
+
+            # Send a POST request to the API endpoint with the headers and parameters
+            response = http_client.post(
+                c.URL, headers=self.header, data=c.PARAMS)
+
+            # A failed request raises, so the response here is always successful
+            try:
+                response_data = response.json()
+                self.access_token = response_data['access_token']
+            except (KeyError, ValueError) as e:
+                raise ParseError('The token response did not contain an access token') from e
+
+            self.expires_at = time.time() + response_data.get('expires_in', 0)
+            self.save_cached_token()
+
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        """Function that refreshes the token in the background shortly before it expires
+        """
+
+        if self.timer:
+            self.timer.cancel()
+
+        delay = self.expires_at - c.TOKEN_REFRESH_MARGIN - time.time()
+        if delay <= 0:
+            return
+
+        self.timer = threading.Timer(delay, self.background_refresh)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def background_refresh(self):
+        with self.lock:
+            try:
+                self.refresh_access_token()
+            except Exception as e:
+                # The token is refreshed on demand once it expires
+                print('Error: could not refresh access token:', e)
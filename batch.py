@@ -0,0 +1,282 @@
+"""Module for generating many album pages in one go
+
+Jobs are read from a JSONL or CSV file and run on a pool of worker threads. The
+workers share the HTTP session pool, the rate limiters and the caches, and every
+page is written to the output directory as soon as its job finishes.
+
+Usage: python batch.py albums.jsonl --output ./albums/ --workers 4
+
+With --artist, every album of the artist is generated from a single discography fetch
+instead, and the optional jobs file only needs one line of the shared information.
+"""
+
+import argparse
+import asyncio
+import copy
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import constants as c
+import http_client
+from errors import WaferError
+from run import run_async, run_discography
+
+# External link sites, in the order they are listed on the page
+EXTERNAL_LINKS = ('discogs', 'metal_archives', 'bandcamp')
+
+# CSV cells that hold a list separate the values with this
+CSV_SEPARATOR = ';'
+
+# Everything a job may leave out
+DEFAULT_ALBUM_INFO = {
+    'link': '',
+    'type': None,
+    'recorded': '',
+    'producer': '',
+    'studio': '',
+    'genres': [],
+    'toc': True,
+    'stub': False,
+    'reviews': [],
+    'members': [],
+    'external_links': [],
+    'classes': [],
+}
+
+
+def create_album_info(job):
+    """Function that fills in everything a job may leave out of the album_info dict
+
+    Args:
+        job (dict): Album information, at least the Tidal album link
+
+    Returns:
+        dict: Album information in the shape app.py builds
+    """
+
+    album_info = copy.deepcopy(DEFAULT_ALBUM_INFO)
+    album_info.update(job)
+
+    if not album_info['link']:
+        raise ValueError('Every job needs an album link')
+
+    return album_info
+
+
+def split_cell(value):
+    return [part.strip() for part in (value or '').split(CSV_SEPARATOR) if part.strip()]
+
+
+def parse_bool(value, default):
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def parse_csv_row(row):
+    """Function that converts a CSV row to a job
+
+    List cells (genres, reviews, members and classes) separate their values with a
+    semicolon, members are written as 'Name: instruments'. External links go in the
+    discogs, metal_archives and bandcamp columns.
+
+    Args:
+        row (dict): The row, keyed by the header
+
+    Returns:
+        dict: The job
+    """
+
+    members = []
+    for member in split_cell(row.get('members')):
+        name, _, instruments = member.partition(':')
+        members.append({"name": name.strip(), "instruments": instruments.strip()})
+
+    return {
+        'link': (row.get('link') or '').strip(),
+        'type': row.get('type') or None,
+        'recorded': row.get('recorded') or '',
+        'producer': row.get('producer') or '',
+        'studio': row.get('studio') or '',
+        'genres': split_cell(row.get('genres')),
+        'toc': parse_bool(row.get('toc'), True),
+        'stub': parse_bool(row.get('stub'), False),
+        'reviews': split_cell(row.get('reviews')),
+        'members': members,
+        'external_links': [{"name": name, "url": row.get(name) or ''} for name in EXTERNAL_LINKS],
+        'classes': split_cell(row.get('classes')),
+    }
+
+
+def read_jobs(file, file_format, require_link=True):
+    """Function that reads the jobs from a file
+
+    Args:
+        file (file): File of jobs
+        file_format (string): 'jsonl' or 'csv'
+        require_link (bool): Whether every job has to have an album link
+
+    Returns:
+        list: Album information of every job
+    """
+
+    if file_format == 'csv':
+        jobs = [parse_csv_row(row) for row in csv.DictReader(file)]
+    else:
+        jobs = [json.loads(line) for line in file if line.strip()]
+
+    if not require_link:
+        return [dict(copy.deepcopy(DEFAULT_ALBUM_INFO), **job) for job in jobs]
+
+    return [create_album_info(job) for job in jobs]
+
+
+def run_job(album_info, output):
+    """Function that generates and saves the page of one job
+
+    Args:
+        album_info (dict): Album information of the job
+        output (string): Directory the page is written to
+
+    Returns:
+        dict: Link, status, error, reviews that missed the deadline and running time of
+       the job
+    """
+
+    start = time.perf_counter()
+    result = {"link": album_info['link'], "status": "ok", "error": None, "missing_reviews": []}
+
+    try:
+        # Every worker thread gets its own event loop for the steps of its job
+        _, result['missing_reviews'] = asyncio.run(run_async(album_info, directory=output))
+    except WaferError as e:
+        result.update(status="error", error=str(e))
+    except Exception as e:
+        # A broken job shouldn't take the rest of the batch down with it
+        result.update(status="error", error=repr(e))
+
+    result['seconds'] = round(time.perf_counter() - start, 3)
+
+    return result
+
+
+def run_batch(jobs, output, workers=c.BATCH_WORKERS):
+    """Function that runs the jobs on a worker pool and reports each one as it finishes
+
+    Results are appended to results.jsonl in the output directory and printed.
+
+    Args:
+        jobs (list): Album information of every job
+        output (string): Directory the pages are written to
+        workers (int): Number of jobs run at the same time
+
+    Returns:
+        int: Number of failed jobs
+    """
+
+    os.makedirs(output, exist_ok=True)
+
+    failed = 0
+
+    with open(os.path.join(output, 'results.jsonl'), 'a', encoding='utf-8') as log, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, job, output) for job in jobs]
+
+        for future in as_completed(futures):
+            result = future.result()
+
+            if result['status'] != 'ok':
+                failed += 1
+
+            log.write(json.dumps(result, ensure_ascii=False) + '\n')
+            log.flush()
+
+            print(f"[{result['status']}] {result['link']} ({result['seconds']} s)"
+                  + (f": {result['error']}" if result['error'] else ''))
+            for review in result['missing_reviews']:
+                print(f"  review {review} did not arrive in time")
+
+    print(f"{len(jobs) - failed}/{len(jobs)} pages generated")
+
+    return failed
+
+
+def run_artist(artist_id, album_info, output):
+    """Function that generates the pages of every album of an artist
+
+    Args:
+        artist_id (string): Tidal ID of the artist
+        album_info (dict): Album information shared by every page
+        output (string): Directory the pages are written to
+
+    Returns:
+        int: 1 if the discography couldn't be generated, 0 otherwise
+    """
+
+    start = time.perf_counter()
+
+    try:
+        templates = run_discography(artist_id, album_info, directory=output)
+    except WaferError as e:
+        print(f'Error: could not fetch the discography of {artist_id}: {e}', file=sys.stderr)
+        return 1
+
+    print(f"{len(templates)} pages generated in {time.perf_counter() - start:.1f} s")
+
+    return 0
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Generate album pages for many albums at once')
+    parser.add_argument('jobs', nargs='?',
+                        help="JSONL or CSV file of album jobs, '-' for stdin")
+    parser.add_argument('--artist',
+                        help='Tidal ID of an artist whose every album is generated')
+    parser.add_argument('--format', choices=('jsonl', 'csv'),
+                        help='Format of the jobs, guessed from the file extension by default')
+    parser.add_argument('--output', default=c.BATCH_OUTPUT_DIR,
+                        help='Directory the pages are written to')
+    parser.add_argument('--workers', type=int, default=c.BATCH_WORKERS,
+                        help='Number of albums generated at the same time')
+
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+
+    args = parse_arguments()
+
+    if not args.jobs and not args.artist:
+        print('Error: give a jobs file, an artist ID or both', file=sys.stderr)
+        sys.exit(2)
+
+    album_jobs = []
+
+    if args.jobs:
+        file_format = args.format or ('csv' if args.jobs.lower().endswith('.csv') else 'jsonl')
+
+        try:
+            if args.jobs == '-':
+                album_jobs = read_jobs(sys.stdin, file_format, not args.artist)
+            else:
+                with open(args.jobs, encoding='utf-8', newline='') as f:
+                    album_jobs = read_jobs(f, file_format, not args.artist)
+        except (OSError, ValueError) as e:
+            print(f'Error: could not read the jobs: {e}', file=sys.stderr)
+            sys.exit(2)
+
+    try:
+        if args.artist:
+            shared_info = album_jobs[0] if album_jobs else copy.deepcopy(DEFAULT_ALBUM_INFO)
+            exit_code = run_artist(args.artist, shared_info, args.output)
+        else:
+            exit_code = 1 if run_batch(album_jobs, args.output, max(1, args.workers)) else 0
+    finally:
+        # Every worker is done by now, so the pooled connections can go
+        http_client.close()
+
+    sys.exit(exit_code)
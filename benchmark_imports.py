@@ -0,0 +1,137 @@
+"""Module for measuring how long the entry modules take to import
+
+Every module is imported in a fresh interpreter a number of times and the median is
+reported. The imports run in a scratch directory with a populated response cache, so
+startup work that grows with the cache shows up too. The run fails if an import pulls
+in a dependency that should only be loaded on first use, creates files, or takes
+longer than the given budget.
+
+Usage: python benchmark_imports.py --runs 5 --budget-ms 400 > bench_output.txt
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import constants as c
+
+# Modules the command line tools and the app start from
+MODULES = ('helpers', 'review_scraper', 'run', 'batch')
+
+# Dependencies that must only be imported once they are actually needed
+DEFERRED = ('bs4', 'lxml', 'fake_useragent')
+
+MEASURE = '''
+import json, os, sys, time
+def listing():
+    return {os.path.join(root, name) for root, dirs, files in os.walk('.')
+            for name in dirs + files}
+before = listing()
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({
+    "ms": elapsed,
+    "deferred": [name for name in sys.argv[2:] if name in sys.modules],
+    "authenticated": getattr(module, "access_token", None) is not None,
+    "created": sorted(listing() - before),
+}))
+'''
+
+
+def populate_cache(directory, entries):
+    """Function that fills a scratch directory with response cache entries
+
+    Args:
+        directory (string): Directory the imports run in
+        entries (int): Number of cached responses
+    """
+
+    cache_dir = os.path.join(directory, c.RESPONSE_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    for i in range(entries):
+        base = os.path.join(cache_dir, f'{i:064x}')
+        with open(base + '.body', 'wb') as f:
+            f.write(b'x' * 1024)
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'url': f'https://example.com/{i}'}, f)
+
+
+def measure(module, runs, directory):
+    """Function that imports a module in fresh interpreters and collects the results
+
+    Args:
+        module (string): Name of the module
+        runs (int): Number of imports
+        directory (string): Directory the imports run in
+
+    Returns:
+        dict: Median import time in milliseconds, the deferred dependencies that got
+       imported, whether the credentials were loaded and the files the import created
+    """
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [root, os.environ.get('PYTHONPATH')])))
+
+    times = []
+    result = None
+
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', MEASURE, module, *DEFERRED],
+            capture_output=True, text=True, env=env, cwd=directory, check=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        times.append(result['ms'])
+
+    return {"ms": statistics.median(times), "deferred": result['deferred'],
+            "authenticated": result['authenticated'], "created": result['created']}
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the import time of the entry modules')
+    parser.add_argument('modules', nargs='*', default=MODULES, help='Modules to import')
+    parser.add_argument('--runs', type=int, default=5, help='Imports per module')
+    parser.add_argument('--cache-entries', type=int, default=5000,
+                        help='Responses put in the scratch response cache')
+    parser.add_argument('--budget-ms', type=float,
+                        help='Fail if the median import of a module takes longer')
+
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+
+    args = parse_arguments()
+
+    failed = False
+
+    with tempfile.TemporaryDirectory() as scratch:
+        populate_cache(scratch, args.cache_entries)
+
+        for name in args.modules:
+            try:
+                result = measure(name, max(1, args.runs), scratch)
+            except subprocess.CalledProcessError as e:
+                print(f'Error: could not import {name}: {e.stderr.strip()}', file=sys.stderr)
+                failed = True
+                continue
+
+            problems = [f'imports {dependency}' for dependency in result['deferred']]
+            if result['authenticated']:
+                problems.append('loads the credentials')
+            if result['created']:
+                problems.append('creates ' + ', '.join(result['created']))
+            if args.budget_ms is not None and result['ms'] > args.budget_ms:
+                problems.append(f'over the {args.budget_ms:.0f} ms budget')
+
+            failed = failed or bool(problems)
+
+            print(f"{name:<16}{result['ms']:8.1f} ms  " + (', '.join(problems) or 'ok'))
+
+    sys.exit(1 if failed else 0)
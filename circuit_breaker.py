@@ -0,0 +1,81 @@
+"""Module that hosts the per-domain circuit breakers used for review scraping
+"""
+
+import threading
+import time
+
+import constants as c
+
+
+class CircuitBreaker:
+    """Circuit breaker for one review site
+
+    After enough failures in a row the circuit opens and requests are skipped. Once
+    the reset timeout has passed, a single trial request is let through: if it works
+    the circuit closes again, if it fails it stays open for another timeout.
+
+    Args:
+        failure_threshold (int): Failures in a row that open the circuit
+        reset_timeout (float): Seconds to wait before trying the site again
+    """
+
+    def __init__(self, failure_threshold, reset_timeout) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Function that tells whether a request to the site may be made
+
+        Returns:
+            bool: False while the circuit is open
+        """
+
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_running:
+                return False
+
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+breakers = {}
+breakers_lock = threading.Lock()
+
+
+def get_breaker(domain):
+    """Function that returns the circuit breaker shared by every request to the domain
+
+    Args:
+        domain (string): Domain of the review site
+
+    Returns:
+        CircuitBreaker: The circuit breaker
+    """
+
+    with breakers_lock:
+        breaker = breakers.get(domain)
+        if breaker is None:
+            breaker = CircuitBreaker(c.CIRCUIT_FAILURE_THRESHOLD, c.CIRCUIT_RESET_TIMEOUT)
+            breakers[domain] = breaker
+
+    return breaker
@@ -4,6 +4,85 @@ PARAMS = {'grant_type': 'client_credentials'}
 
 KK = ['tammikuuta', 'helmikuuta', 'maaliskuuta', 'huhtikuuta', 'toukokuuta', 'kesäkuuta',
       'heinäkuuta', 'elokuuta', 'syyskuuta', 'lokakuuta', 'marraskuuta', 'joulukuuta']
-SUPPORTED_DOMAINS = ['kaaoszine.fi', 'www.soundi.fi', 'metalliluola.fi', 'blabbermouth.net',
-                      'metalinjection.net', 'www.metalsucks.net', 'www.inferno.fi',
-                      'www.angrymetalguy.com', 'distortedsoundmag.com', 'www.loudersound.com']
+
+# Discography cache, keyed by Tidal artist ID. Entries expire after the TTL (seconds)
+# and the least recently used artist is evicted once the cache is full
+DISCOGRAPHY_CACHE_SIZE = 128
+DISCOGRAPHY_CACHE_TTL = 600
+
+# In-memory caches shared by every session of the process, see shared_cache.py.
+# Sizes are in entries, TTLs in seconds
+ALBUM_CACHE_SIZE = 512
+ALBUM_CACHE_TTL = 600
+TRACKLIST_CACHE_SIZE = 512
+TRACKLIST_CACHE_TTL = 600
+REVIEW_MEMORY_CACHE_SIZE = 1024
+REVIEW_MEMORY_CACHE_TTL = 600
+
+# Shared HTTP client settings. Timeouts are (connect, read) seconds, pool sizes are per host
+HTTP_TIMEOUT = (3, 5)
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 10
+HTTP_POOL_SIZES = {'openapi.tidal.com': 20}
+
+# Reviews are fetched concurrently, with at most REVIEW_DOMAIN_CONCURRENCY requests per site
+REVIEW_WORKERS = 8
+REVIEW_DOMAIN_CONCURRENCY = 2
+
+# Token bucket rate limits per host as (requests per second, burst size)
+RATE_LIMITS = {'openapi.tidal.com': (2, 5)}
+# How many times a request is retried after a 429 response, and the wait used when
+# the response doesn't carry a Retry-After header
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_DEFAULT_WAIT = 1
+
+# Page size used when fetching album tracks, the rest of the pages are fetched in parallel
+TRACKS_PAGE_SIZE = 30
+TRACKS_WORKERS = 4
+
+# Persistent discography index. Artists older than the TTL (seconds) are refreshed from the API
+DISCOGRAPHY_INDEX_PATH = './cache/discography.sqlite3'
+DISCOGRAPHY_INDEX_TTL = 24 * 60 * 60
+DISCOGRAPHY_PAGE_SIZE = 50
+
+# OAuth token cache shared by every worker process. Tokens are refreshed in the background
+# this many seconds before they expire
+TOKEN_CACHE_PATH = './cache/token.json'
+TOKEN_REFRESH_MARGIN = 60
+
+# Disk-backed HTTP response cache. TTLs are in seconds per host, other hosts (ie. review
+# sites) use the default. Stale entries are revalidated with ETag/Last-Modified
+RESPONSE_CACHE_DIR = './cache/responses'
+RESPONSE_CACHE_MAX_SIZE = 200 * 1024 * 1024
+RESPONSE_CACHE_TTLS = {'openapi.tidal.com': 60 * 60}
+RESPONSE_CACHE_DEFAULT_TTL = 7 * 24 * 60 * 60
+
+# Extracted review records, keyed by normalised URL
+REVIEW_CACHE_PATH = './cache/reviews.sqlite3'
+REVIEW_CACHE_TTL = 30 * 24 * 60 * 60
+
+# Review pages are streamed and the download stops once the fields we need have been seen
+REVIEW_STREAMING = True
+REVIEW_STREAM_CHUNK_SIZE = 16 * 1024
+
+# Directory with extra review site extractors, see extractors.py
+REVIEW_PLUGIN_DIR = './review_plugins'
+
+# Keep using the same user agent for every request to a review site, so its pooled
+# keep-alive connections look like one client
+STICKY_USER_AGENT = True
+
+# A review site is skipped for CIRCUIT_RESET_TIMEOUT seconds after this many failures in a
+# row, and a page waits at most REVIEW_DEADLINE seconds for its reviews
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_TIMEOUT = 300
+REVIEW_DEADLINE = 15
+
+# Timeouts, connection errors and 5xx responses are retried with exponential backoff
+HTTP_RETRIES = 2
+HTTP_BACKOFF = 0.5
+HTTP_RETRY_STATUSES = {500, 502, 503, 504}
+
+# Batch generation, see batch.py
+BATCH_WORKERS = 4
+BATCH_OUTPUT_DIR = './albums/'
@@ -0,0 +1,269 @@
+"""Module that hosts the persistent SQLite discography index
+
+The index keeps one row per album, indexed by artist and release date. Lookups are
+done on a Discography, a date sorted view of one artist's albums.
+
+The rows carry everything the info box needs (artist name and duration included), so
+the pages of a whole discography can be generated without fetching every album.
+"""
+
+import bisect
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import constants as c
+from errors import ParseError
+
+# Bump this whenever SCHEMA changes, older databases are rebuilt from the API
+SCHEMA_VERSION = 2
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS albums (
+    album_id     TEXT PRIMARY KEY,
+    artist_id    TEXT NOT NULL,
+    title        TEXT NOT NULL,
+    release_date TEXT,
+    type         TEXT,
+    available    INTEGER NOT NULL DEFAULT 1,
+    artist_name  TEXT,
+    duration     INTEGER
+);
+CREATE INDEX IF NOT EXISTS albums_artist_date ON albums (artist_id, release_date);
+CREATE TABLE IF NOT EXISTS artists (
+    artist_id    TEXT PRIMARY KEY,
+    total        INTEGER,
+    refreshed_at REAL NOT NULL
+);
+'''
+
+
+def parse_album_item(artist_id, item):
+    """Helper function to turn an item of the artist albums response into an index row
+
+    Args:
+        artist_id (string): Tidal ID of the artist
+        item (dict): Item of the API response
+
+    Returns:
+        tuple: Album ID, artist ID, title, release date, type, availability, artist name
+       and duration
+    """
+
+    if item['status'] == 451 or 'resource' not in item:
+        return (str(item['id']), str(artist_id), 'Not available', None, None, 0, None, None)
+
+    resource = item['resource']
+
+    # Name the artist the way this release credits them, falling back to the main artist
+    artists = resource.get('artists') or []
+    artist_name = next((artist['name'] for artist in artists
+                        if str(artist.get('id')) == str(artist_id)),
+                       artists[0]['name'] if artists else None)
+
+    return (str(resource['id']), str(artist_id), resource['title'],
+            resource.get('releaseDate'), resource.get('type'), 1,
+            artist_name, resource.get('duration'))
+
+
+class DiscographyIndex:
+    """Discography index stored in a local SQLite database
+
+    Args:
+        path (string): Path to the database file
+        ttl (int): Seconds after which an artist is refreshed from the API
+    """
+
+    def __init__(self, path, ttl) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+
+        with self.lock, self.connection:
+            self.migrate()
+            self.connection.executescript(SCHEMA)
+
+    def migrate(self):
+        """Function that drops the tables of an outdated database
+
+        The index is only a cache of the API, so rather than converting old rows the
+        tables are recreated and every artist is fetched again on first use.
+        """
+
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+
+        if version < SCHEMA_VERSION:
+            self.connection.execute('DROP TABLE IF EXISTS albums')
+            self.connection.execute('DROP TABLE IF EXISTS artists')
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def is_fresh(self, artist_id):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT refreshed_at FROM artists WHERE artist_id = ?',
+                (str(artist_id),)).fetchone()
+
+        return row is not None and time.time() - row['refreshed_at'] < self.ttl
+
+    def refresh(self, artist_id, fetch_page):
+        """Function that brings the artist up to date with the API
+
+        Pages are requested until the index holds as many albums as the API reports.
+        The API lists the newest albums first, so an artist that is already indexed
+        usually only costs a single page. Without a total count we keep going until a
+        page comes back short.
+
+        Args:
+            artist_id (string): Tidal ID of the artist
+            fetch_page (callable): Called with the artist ID and an offset, returns the
+               JSON response of the artist albums endpoint
+        """
+
+        artist_id = str(artist_id)
+
+        with self.lock:
+            known = {row['album_id'] for row in self.connection.execute(
+                'SELECT album_id FROM albums WHERE artist_id = ?', (artist_id,))}
+
+        offset = 0
+        total = None
+
+        while True:
+            json_response = fetch_page(artist_id, offset)
+
+            try:
+                items = json_response['data']
+                rows = [parse_album_item(artist_id, item) for item in items]
+            except (KeyError, IndexError, TypeError) as e:
+                raise ParseError(f'Unexpected discography data for {artist_id}: {e!r}') from e
+
+            with self.lock, self.connection:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO albums VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+            page_ids = {row[0] for row in rows}
+            only_known = page_ids <= known
+            known |= page_ids
+            offset += len(items)
+            total = json_response.get('metadata', {}).get('total')
+
+            if total is None:
+                if len(items) < c.DISCOGRAPHY_PAGE_SIZE:
+                    break
+                continue
+
+            if not items or offset >= total:
+                break
+            # Nothing new on this page and nothing missing overall, we're up to date
+            if only_known and len(known) >= total:
+                break
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO artists VALUES (?, ?, ?)',
+                (artist_id, total if total is not None else offset, time.time()))
+
+    def albums(self, artist_id, album_type='ALBUM'):
+        """Function that lists the available albums of an artist, oldest first
+
+        Args:
+            artist_id (string): Tidal ID of the artist
+            album_type (string): Type of the releases to list
+
+        Returns:
+            list: A list of dictionaries of albums, with ID, title, release date, type,
+           artist name and duration
+        """
+
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT album_id, title, release_date, type, artist_name, duration FROM albums '
+                'WHERE artist_id = ? AND type = ? AND available = 1 '
+                'ORDER BY release_date, album_id',
+                (str(artist_id), album_type)).fetchall()
+
+        return [dict(row) for row in rows]
+
+
+def parse_release_date(release_date):
+    """Helper function to parse a release date from the API
+
+    Args:
+        release_date (string): Release date, ie. '2024-01-31'
+
+    Returns:
+        datetime.date: The parsed date, None if it's missing or invalid
+    """
+
+    try:
+        return date.fromisoformat(release_date)
+    except (TypeError, ValueError):
+        return None
+
+
+class Discography:
+    """Albums of one artist sorted by release date
+
+    Neighbours are found with a binary search, and the current album is matched by its
+    Tidal ID, so reissues with identical titles don't get mixed up.
+
+    Args:
+        albums (list): Dictionaries of albums with ID, title and release date
+    """
+
+    def __init__(self, albums) -> None:
+        dated = []
+        for album in albums:
+            released = parse_release_date(album['release_date'])
+            if released:
+                dated.append(((released, str(album['album_id'])), album))
+
+        dated.sort(key=lambda pair: pair[0])
+
+        self.keys = [key for key, _ in dated]
+        self.albums = [album for _, album in dated]
+        self.by_id = {str(album['album_id']): i for i, album in enumerate(self.albums)}
+
+    def neighbours(self, album_id, title, release_date):
+        """Function that finds the closest older and newer album
+
+        Albums with the same title are skipped, so reissues don't count as neighbours.
+
+        Args:
+            album_id (string): Tidal ID of the current album
+            title (string): Title of the current album
+            release_date (string): Release date of the current album, ie. '2024-01-31'
+
+        Returns:
+            tuple: Previous and next album as dicts, None when not available
+        """
+
+        album_id = str(album_id)
+        index = self.by_id.get(album_id)
+
+        if index is not None:
+            older, newer = index - 1, index + 1
+        else:
+            # Not in the list (ie. not an album type release), place it by its date
+            released = parse_release_date(release_date)
+            if released is None:
+                return None, None
+            position = bisect.bisect_left(self.keys, (released, album_id))
+            older, newer = position - 1, position
+
+        while older >= 0 and self.albums[older]['title'] == title:
+            older -= 1
+        while newer < len(self.albums) and self.albums[newer]['title'] == title:
+            newer += 1
+
+        previous_album = self.albums[older] if older >= 0 else None
+        next_album = self.albums[newer] if newer < len(self.albums) else None
+
+        return previous_album, next_album
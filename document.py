@@ -0,0 +1,61 @@
+"""Module that hosts the in-memory wiki document builder
+"""
+
+import os
+import tempfile
+
+
+class WikiDocument:
+    """Wiki page assembled in memory
+
+    Sections are collected into a buffer and joined once, so building a page doesn't
+    touch the disk at all. The result is only written out when save is called.
+    """
+
+    def __init__(self, contents='') -> None:
+        self.parts = [contents] if contents else []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def getvalue(self):
+        contents = ''.join(self.parts)
+        # Keep the joined string so repeated reads don't join again
+        self.parts = [contents]
+        return contents
+
+    def save(self, path):
+        """Function that atomically writes the document to a file
+
+        Concurrent saves of the same page never leave a mixed file.
+
+        Args:
+            path (string): Path to the output file
+        """
+
+        atomic_write(path, self.getvalue())
+
+
+def atomic_write(path, data, mode='w'):
+    """Function that atomically writes a file
+
+    The data is written to a temporary file in the same directory, which then replaces
+    the target. Readers see either the old file or the new one, never a mix.
+
+    Args:
+        path (string): Path to the file
+        data (string or bytes): Contents of the file
+        mode (string): 'w' for text, written as UTF-8, or 'wb' for bytes
+    """
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
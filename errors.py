@@ -0,0 +1,56 @@
+"""Module that hosts the WAFER exception hierarchy
+
+Helpers raise these instead of exiting, so a failed lookup only fails its own job.
+Only the entry points turn them into exit codes or error messages.
+"""
+
+
+class WaferError(Exception):
+    """Base class of every WAFER error"""
+
+    exit_code = 1
+
+
+class NotFoundError(WaferError):
+    """The requested resource does not exist (404)"""
+
+    exit_code = 3
+
+
+class UnavailableError(WaferError):
+    """The resource is blocked on demand of the right-holders (451)"""
+
+    exit_code = 4
+
+
+class RateLimitedError(WaferError):
+    """The API kept answering 429 after the retries
+
+    Args:
+        message (string): Error message
+        retry_after (float, optional): Seconds the API asked us to wait
+    """
+
+    exit_code = 5
+
+    def __init__(self, message, retry_after=None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RequestTimeoutError(WaferError):
+    """The request timed out on every attempt"""
+
+    exit_code = 6
+
+
+class ParseError(WaferError):
+    """The response didn't contain what we expected"""
+
+    exit_code = 7
+
+
+class UpstreamError(WaferError):
+    """Any other HTTP or connection failure"""
+
+    exit_code = 8
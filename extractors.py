@@ -0,0 +1,416 @@
+"""Module that hosts the review site extractors
+
+Every supported site has an extractor class registered by its domain. The class holds
+everything site specific: the elements to parse, the download markers, the rating
+scale, the language and the code that reads the review details from the page.
+"""
+
+import importlib.util
+import os
+import platform
+import re
+import threading
+from datetime import datetime
+from functools import cached_property
+
+import constants as c
+
+EXTRACTORS = {}
+
+# The plugin directory is only read on the first lookup, not when the module is imported
+plugins_loaded = False
+plugins_lock = threading.Lock()
+
+
+def register(cls):
+    """Class decorator that registers an extractor for its domain
+
+    The extractor is instantiated once here, so its markers are only prepared at
+    registration. The strainer is built on the first scrape of the site.
+    """
+
+    EXTRACTORS[cls.domain] = cls()
+    return cls
+
+
+def get_extractor(domain):
+    """Function that returns the extractor of a review site
+
+    Args:
+        domain (string): Domain of the review site
+
+    Returns:
+        ReviewExtractor: The extractor, None if the site is not supported
+    """
+
+    global plugins_loaded
+
+    if not plugins_loaded:
+        with plugins_lock:
+            if not plugins_loaded:
+                load_plugins(c.REVIEW_PLUGIN_DIR)
+                plugins_loaded = True
+
+    return EXTRACTORS.get(domain)
+
+
+def load_plugins(directory):
+    """Function that imports extra extractors from a plugin directory
+
+    Every .py file in the directory is imported, and the extractors it registers with
+    the register decorator become available.
+
+    Args:
+        directory (string): Path to the plugin directory
+    """
+
+    if not os.path.isdir(directory):
+        return
+
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.py') or filename.startswith('_'):
+            continue
+
+        name = f'review_plugins.{filename[:-3]}'
+        spec = importlib.util.spec_from_file_location(
+            name, os.path.join(directory, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+
+def convert_date(date):
+    if platform.system() == 'Windows':
+        return datetime.strptime(date, '%Y-%m-%d').strftime('%#d.%#m.%Y')
+    return datetime.strptime(date, '%Y-%m-%d').strftime('%-d.%-m.%Y')
+
+
+class ReviewExtractor:
+    """Base class of the review site extractors
+
+    The defaults read the OpenGraph and article meta tags, so a site that publishes
+    them only needs its domain, rating scale and a rating method.
+    """
+
+    domain = None
+    # Name of the site in the rating list, derived from the domain if not set
+    site = None
+    max_rating = 10
+    # 'en' marks the reference as English
+    language = 'fi'
+    # Elements the extractor reads, by tag name, class or attribute. Only these (and
+    # everything inside them) are parsed out of the page
+    tags = {'title', 'meta'}
+    classes = set()
+    attrs = {}
+    # Once every marker has shown up in the HTML, the fields are on the page and the
+    # rest doesn't have to be downloaded
+    markers = ()
+    # Whether the author is turned into Lastname, Firstname format
+    invert_author = True
+
+    def __init__(self) -> None:
+        if self.site is None:
+            split_domain = self.domain.split('.')
+            self.site = split_domain[0].title() if len(
+                split_domain) == 2 else split_domain[1].title()
+
+        self.marker_bytes = [marker.encode() for marker in self.markers]
+
+    @cached_property
+    def strainer(self):
+        return self.build_strainer()
+
+    def build_strainer(self):
+        # bs4 is imported here, so registering the extractors doesn't import it
+        from bs4 import SoupStrainer
+
+        tags = set(self.tags)
+        classes = set(self.classes)
+        attrs = dict(self.attrs)
+
+        def match(name, tag_attrs):
+            if name in tags:
+                return True
+
+            # Structured data is always kept for get_structured_review
+            if name == 'script' and tag_attrs.get('type') == 'application/ld+json':
+                return True
+
+            tag_classes = tag_attrs.get('class') or ''
+            if isinstance(tag_classes, str):
+                tag_classes = tag_classes.split()
+            if classes.intersection(tag_classes):
+                return True
+
+            return any(tag_attrs.get(key) == value for key, value in attrs.items())
+
+        return SoupStrainer(match)
+
+    def format_author(self, author):
+        # If "real" name, try to split is so we can have it in Lastname, Firstname format
+        if self.invert_author:
+            split = author.split()
+            author = f"{split[1]}, {split[0]}"
+
+        return author
+
+    def title(self, soup):
+        meta_tag = soup.find('meta', property='og:title')
+        if meta_tag:
+            return meta_tag['content'].split('|')[0].strip()
+        return soup.find('title').get_text().split('|')[0].strip()
+
+    def author(self, soup):
+        return soup.find('meta', attrs={'name': 'author'})['content']
+
+    def date(self, soup):
+        meta_tag = soup.find('meta', property='article:published_time')
+        dt = meta_tag['content']
+        dt = dt.split('T')[0]
+        return convert_date(dt)
+
+    def rating(self, soup):
+        return None
+
+
+@register
+class KaaoszineExtractor(ReviewExtractor):
+    domain = 'kaaoszine.fi'
+    max_rating = 5
+    tags = {'meta'}
+    classes = {'article-title', 'author-and-date', 'rating'}
+    markers = ['article:published_time', 'article-title', 'author-and-date', 'rating']
+
+    def title(self, soup):
+        return soup.find(class_='article-title').get_text()
+
+    def author(self, soup):
+        author_and_date_div = soup.find('div', class_='author-and-date')
+        return author_and_date_div.find('strong').get_text()
+
+    def rating(self, soup):
+        rating_div = soup.find(class_='rating')
+        one_count = len(rating_div.find_all(class_='one'))
+        half_count = len(rating_div.find_all(class_='half'))
+        return one_count + 0.5 * half_count
+
+
+@register
+class SoundiExtractor(ReviewExtractor):
+    domain = 'www.soundi.fi'
+    max_rating = 5
+    tags = {'h1', 'meta'}
+    classes = {'text-gray-400', 'justify-center'}
+    markers = ['article:published_time', '</h1>', 'text-gray-400', 'justify-center']
+
+    def title(self, soup):
+        return soup.find('h1').get_text()
+
+    def author(self, soup):
+        date_and_author = soup.find_all('div', class_='text-gray-400')
+        return date_and_author[1].get_text().split(':')[1].strip()[:-1]
+
+    def rating(self, soup):
+        div = soup.find('div', class_='pb-2 flex pt-2 justify-center')
+        ratings = div.find_all('li')
+        return len(ratings)
+
+
+@register
+class MetalliluolaExtractor(ReviewExtractor):
+    domain = 'metalliluola.fi'
+    tags = {'h1', 'h3', 'meta'}
+    classes = {'td-post-author-name'}
+    markers = ['article:published_time', '</h1>', 'td-post-author-name', '</h3>']
+
+    def title(self, soup):
+        return soup.find('h1').get_text()
+
+    def author(self, soup):
+        author_div = soup.find('div', class_='td-post-author-name')
+        return author_div.a.get_text()
+
+    def rating(self, soup):
+        rating = soup.find('h3').get_text()
+        return rating.split('/')[0].strip()
+
+
+@register
+class BlabbermouthExtractor(ReviewExtractor):
+    domain = 'blabbermouth.net'
+    language = 'en'
+    tags = {'h1', 'h2', 'meta'}
+    classes = {'news-relative-items', 'reviews-rate-comments'}
+    markers = ['article:published_time', 'margin__bottom-default', 'news-relative-items',
+               'reviews-rate-comments']
+
+    def title(self, soup):
+        artist = soup.find(
+            'h1', class_='margin__top-default margin__bottom-default').get_text()
+        album = soup.find('h2', class_='margin__bottom-default').get_text()
+        return artist + ' - ' + album
+
+    def author(self, soup):
+        author_div = soup.find('div', class_='news-relative-items').find('div')
+        return author_div.get_text(strip=True).replace('Author:', '')
+
+    def rating(self, soup):
+        rating_div = soup.find('div', class_='reviews-rate-comments')
+        return rating_div.find('div').get_text().split(
+            '/')[0].strip() if rating_div else None
+
+
+@register
+class MetalInjectionExtractor(ReviewExtractor):
+    domain = 'metalinjection.net'
+    site = 'Metal Injection'
+    language = 'en'
+    tags = {'h1', 'meta'}
+    classes = {'zox-author-name', 'rwp-overlall-score-value'}
+    markers = ['article:published_time', '</h1>', 'zox-author-name', 'rwp-overlall-score-value']
+
+    def title(self, soup):
+        return soup.find('h1').get_text()
+
+    def author(self, soup):
+        author_span = soup.find('span', class_='zox-author-name')
+        return author_span.find('a').get_text()
+
+    def rating(self, soup):
+        rating_span = soup.find(
+            'span', class_='rwp-overlall-score-value')
+        return rating_span.get_text() if rating_span else None
+
+
+@register
+class MetalSucksExtractor(ReviewExtractor):
+    domain = 'www.metalsucks.net'
+    max_rating = 5
+    language = 'en'
+    tags = {'h1', 'meta'}
+    classes = {'author', 'rating'}
+    markers = ['article:published_time', '</h1>', 'author', 'rating']
+
+    def title(self, soup):
+        return soup.find('h1').get_text()
+
+    def author(self, soup):
+        return soup.find('span', class_='author').find('a').get_text()
+
+    def rating(self, soup):
+        img_tag = soup.find('div', class_='rating').find('img')
+        src_value = img_tag['src']
+        rating = src_value.split('/')[-1].split('.')[0].split('-')[1]
+        if rating[1] == 5:
+            rating = int(rating) / 10
+        else:
+            rating = int(int(rating) / 10)
+        return rating
+
+
+@register
+class InfernoExtractor(ReviewExtractor):
+    domain = 'www.inferno.fi'
+    max_rating = 5
+    tags = {'h1', 'meta'}
+    classes = {'text-gray-400', 'review-rating'}
+    attrs = {'rel': 'author'}
+    markers = ['</h1>', 'rel="author"', 'text-gray-400', 'review-rating']
+
+    def title(self, soup):
+        return soup.find('h1').get_text()
+
+    def author(self, soup):
+        return soup.find('a', {'rel': 'author'}).get_text()
+
+    def date(self, soup):
+        return soup.find('div', class_='pr-2 pl-1 text-gray-400').get_text()
+
+    def rating(self, soup):
+        img_tag = soup.find('div', class_='review-rating').find('img')
+        lazy_src_url = img_tag['data-lazy-src']
+        rating = lazy_src_url.split('/')[-1].split('.')[0]
+        if '-' in rating:
+            rating = rating.replace('-', '.')
+        return rating
+
+
+@register
+class AngryMetalGuyExtractor(ReviewExtractor):
+    domain = 'www.angrymetalguy.com'
+    site = 'Angry Metal Guy'
+    max_rating = 5
+    language = 'en'
+    tags = {'title', 'meta', 'p'}
+    classes = {'authorname'}
+    markers = ['article:published_time', '</title>', 'authorname', 'Rating']
+    invert_author = False
+    RATING = re.compile('^Rating')
+
+    def title(self, soup):
+        title = soup.find('title').get_text()
+        return title.split('Review')[0].strip()
+
+    def author(self, soup):
+        author = soup.find('span', class_='uppercase authorname').get_text()
+        return author.title()
+
+    def rating(self, soup):
+        rating_text = soup.find('strong', string=self.RATING)
+        rating = rating_text.next_sibling.strip()
+
+        if rating[0] == ':':
+            rating = rating.split(':')[1].split('/')[0].strip()
+        else:
+            rating = rating.split('/')[0].strip()
+        return rating
+
+
+@register
+class DistortedSoundExtractor(ReviewExtractor):
+    domain = 'distortedsoundmag.com'
+    site = 'Distorted Sound Magazine'
+    language = 'en'
+    tags = {'title', 'meta', 'p'}
+    classes = {'cm-author'}
+    markers = ['article:published_time', '</title>', 'cm-author', 'Rating']
+    RATING = re.compile('^Rating')
+
+    def title(self, soup):
+        return ' - '.join([item.strip().title() for item in soup.find('title').get_text().split('-')[:2]])
+
+    def author(self, soup):
+        author_span = soup.find('span', class_='cm-author cm-vcard')
+        return author_span.find('a').get_text()
+
+    def rating(self, soup):
+        rating_b = soup.find('b', string=self.RATING)
+
+        if rating_b:
+            return rating_b.next_sibling.get_text().split('/')[0]
+        return soup.find('strong', string=self.RATING).get_text().split()[1].split('/')[0]
+
+
+@register
+class LoudersoundExtractor(ReviewExtractor):
+    domain = 'www.loudersound.com'
+    site = 'Metal Hammer'
+    max_rating = 5
+    language = 'en'
+    tags = {'title', 'meta'}
+    classes = {'author-byline__author-name', 'rating'}
+    markers = ['article:published_time', '</title>', 'author-byline__author-name',
+               'chunk rating']
+    DIGITS = re.compile(r'\d+')
+
+    def title(self, soup):
+        return soup.find('title').get_text().split('|')[0]
+
+    def author(self, soup):
+        author_span = soup.find('span', class_='author-byline__author-name')
+        return author_span.find('a').get_text()
+
+    def rating(self, soup):
+        rating_span = soup.find('span', class_='chunk rating')
+        rating = rating_span.get('aria-label')
+        return self.DIGITS.findall(rating)[0]
@@ -3,16 +3,68 @@
 
 import os
 import os.path
-import sys
-import shutil
 import re
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 
 import constants as c
+import http_client
+import shared_cache
+from circuit_breaker import get_breaker
 from authentication import Authentication
-from review_scraper import get_review
+from discography_index import DiscographyIndex, Discography
+from document import WikiDocument
+from errors import ParseError, RequestTimeoutError, UpstreamError
+from infobox import ALBUM_INFOBOX
+from review_scraper import get_review, get_cached_review, get_domain
 
-access_token = Authentication()
+# Created on first use, so importing the module doesn't touch the credentials
+access_token = None
+access_token_lock = threading.Lock()
+
+# Opened on first use, so importing the module doesn't create the database
+discography_index = None
+discography_index_lock = threading.Lock()
+
+# Per-domain semaphores shared by every review fetch in this process
+domain_limits = {}
+domain_limits_lock = threading.Lock()
+
+
+def get_authentication():
+    """Helper function to get the shared Authentication, creating it on first use
+
+    Returns:
+        Authentication: The Authentication shared by every request in this process
+    """
+
+    global access_token
+
+    if access_token is None:
+        with access_token_lock:
+            if access_token is None:
+                access_token = Authentication()
+
+    return access_token
+
+
+def get_discography_index():
+    """Helper function to get the shared discography index, opening it on first use
+
+    Returns:
+        DiscographyIndex: The index shared by every lookup in this process
+    """
+
+    global discography_index
+
+    if discography_index is None:
+        with discography_index_lock:
+            if discography_index is None:
+                discography_index = DiscographyIndex(c.DISCOGRAPHY_INDEX_PATH,
+                                                     c.DISCOGRAPHY_INDEX_TTL)
+
+    return discography_index
 
 
 def build_headers():
@@ -22,10 +74,7 @@ def build_headers():
         dict: header
     """
 
-    if access_token.expires_in == 0:
-        access_token.refresh_access_token()
-
-    authorization = 'Bearer ' + access_token.access_token
+    authorization = 'Bearer ' + get_authentication().get_access_token()
 
     headers = {'accept': 'application/vnd.tidal.v1+json',
                'Authorization': authorization,
@@ -35,6 +84,22 @@ def build_headers():
 
 
 def get_release_information(url_id):
+    """Function that gets album information, shared by every caller in the process
+
+    Concurrent lookups of the same album share a single request.
+
+    Args:
+        url_id (string): The last numerical part of tidals album browse URL
+
+    Returns:
+        dict: A dictionary with album title, release date, artist, artist ID and running time
+    """
+
+    return shared_cache.albums.get_or_fetch(
+        str(url_id), partial(fetch_release_information, url_id))
+
+
+def fetch_release_information(url_id):
     """Function that fetches album information
 
     Args:
@@ -49,391 +114,395 @@ def get_release_information(url_id):
     # Construct the full URL based on the provided ID
     url = f'https://openapi.tidal.com/albums/{url_id}?countryCode=US'
 
+    json_response = http_client.get_json(url, headers=headers)
+
     try:
-        response = requests.get(url=url, headers=headers, timeout=(3, 5))
-
-        if response.status_code == 451:
-            sys.exit(f'{response.status_code}: Unavailable due to demand from the right-holders to \
-                      prohibit access to the resource.')
-        elif response.status_code == 404:
-            sys.exit(
-                f'{response.status_code}: The requested resource {url} could not be found')
-        elif response.status_code != 200:
-            sys.exit(
-                f'{response.status_code}: Something went wrong, please try again later')
-    except requests.exceptions.Timeout:
-        sys.exit("The request timed out")
-    except requests.exceptions.RequestException as e:
-        sys.exit("An error occurred:", e)
-
-    json_response = response.json()
-
-    year, month, day = map(
-        int, json_response['resource']['releaseDate'].split('-'))
+        resource = json_response['resource']
+        album_data = create_album_data(
+            resource['id'], resource['title'], resource['releaseDate'],
+            resource['artists'][0]['name'], resource['artists'][0]['id'], resource['duration'])
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise ParseError(f'Unexpected album data for {url_id}: {e!r}') from e
+
+    return album_data
+
+
+def create_album_data(album_id, title, release_date, artist, artist_id, duration):
+    """Helper function to build the album data used by the info box
+
+    Args:
+        album_id (string): Tidal ID of the album
+        title (string): Name of the album
+        release_date (string): Release date, ie. '2024-01-31'
+        artist (string): Name of the artist
+        artist_id (string): Tidal ID of the artist
+        duration (int): Running time in seconds
+
+    Returns:
+        dict: A dictionary with album title, release date, artist, artist ID and running time
+    """
+
+    year, month, day = map(int, release_date.split('-'))
 
     album_data = {
-        'album_title': json_response['resource']['title'],
+        'album_id': str(album_id),
+        'album_title': title,
         'release_year': year,
-        'artist': json_response['resource']['artists'][0]['name'],
-        'artist_id': json_response['resource']['artists'][0]['id'],
+        'release_date': release_date,
+        'artist': artist,
+        'artist_id': artist_id,
         'full_date': f"{day}. {c.KK[month - 1]} {year}",
-        'total_min': json_response['resource']['duration'] // 60,
-        'total_sec': json_response['resource']['duration'] % 60
+        'total_min': duration // 60,
+        'total_sec': duration % 60
     }
 
     return album_data
 
 
-def get_tracklist(tracks_url):
-    """Function that generates album tracklist
+def get_tracks_page(tracks_url):
+    """Function that fetches one page of album tracks
 
     Args:
-        tracks_url (string): Tidal album ID
+        tracks_url (string): API URL of the album items page
 
     Returns:
-        list: A list of dictionaries of tracks holding track number, title, minutes and seconds
+        dict: The JSON response
     """
 
     headers = build_headers()
 
+    return http_client.get_json(tracks_url, headers=headers)
+
+
+def get_tracklist(url_id):
+    """Function that gets the album tracklist, shared by every caller in the process
+
+    Concurrent lookups of the same album share a single fetch.
+
+    Args:
+        url_id (string): Tidal album ID
+
+    Returns:
+        list: A list of dictionaries of tracks, in disc and track order
+    """
+
+    return shared_cache.tracklists.get_or_fetch(str(url_id), partial(fetch_tracklist, url_id))
+
+
+def fetch_tracklist(url_id):
+    """Function that generates album tracklist
+
+    Follows the pagination of the API until every track is retrieved. Once the total
+    track count is known, the remaining pages are fetched in parallel.
+
+    Args:
+        url_id (string): Tidal album ID
+
+    Returns:
+        list: A list of dictionaries of tracks holding disc number, track number, title,
+       minutes and seconds, in disc and track order
+    """
+
+    json_response = get_tracks_page(get_tracks_url(url_id))
+
     try:
-        response = requests.get(
-            url=tracks_url, headers=headers, timeout=(3, 5))
-        json_response = response.json()
-    except requests.exceptions.Timeout:
-        sys.exit("The request timed out")
-    except requests.exceptions.RequestException as e:
-        sys.exit("An error occurred:", e)
-
-    tracklist = []
-
-    for i in json_response['data']:
-        track_num = i['resource']['trackNumber']
-        title = i['resource']['title']
-        duration = i['resource']['duration']
-        minutes, seconds = divmod(duration, 60)
-
-        track = {
-            "track_number": track_num,
-            "track_title": title,
-            "track_minutes": minutes,
-            "track_seconds": seconds
-        }
-
-        tracklist.append(track)
+        items = list(json_response['data'])
+
+        total = json_response.get('metadata', {}).get('total')
+
+        if total is not None:
+            offsets = range(len(items), total, c.TRACKS_PAGE_SIZE)
+            if offsets:
+                urls = [get_tracks_url(url_id, offset) for offset in offsets]
+                workers = min(c.TRACKS_WORKERS, len(urls))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for page in executor.map(get_tracks_page, urls):
+                        items.extend(page['data'])
+        else:
+            # Without a total count we can only keep going until a page comes back short
+            page = json_response
+            while len(page['data']) == c.TRACKS_PAGE_SIZE:
+                page = get_tracks_page(get_tracks_url(url_id, len(items)))
+                items.extend(page['data'])
+
+        tracklist = []
+
+        for i in items:
+            # Tracks that are not available don't carry any track information
+            if 'resource' not in i:
+                continue
+
+            track_num = i['resource']['trackNumber']
+            title = i['resource']['title']
+            duration = i['resource']['duration']
+            minutes, seconds = divmod(duration, 60)
+
+            track = {
+                "disc_number": i['resource'].get('volumeNumber', 1),
+                "track_number": track_num,
+                "track_title": title,
+                "track_minutes": minutes,
+                "track_seconds": seconds
+            }
+
+            tracklist.append(track)
+
+        tracklist.sort(key=lambda track: (track['disc_number'], track['track_number']))
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise ParseError(f'Unexpected tracklist data for {url_id}: {e!r}') from e
 
     return tracklist
 
 
-def construct_path(artist, title):
-    """Function that creates the output file
+def construct_path(artist, title, directory='./albums/'):
+    """Function that builds the path of the output file
 
     Args:
         artist (string): Name of the artist
         title (string): Name of the album
+        directory (string, optional): Directory of the output file
 
     Returns:
-        string: A path to the file the function created
+        string: A path to the output file
     """
 
-    # Define the directory path
-    directory = './albums/'
-
-    # Ensure the directory exists, create it if it doesn't
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-
     # Construct the full file path
     path = os.path.join(
         directory, f"{artist.replace(' ', '_')}-{title.replace(' ', '_')}.txt")
 
-    # Attempt to remove the file if it already exists
-    if os.path.isfile(path):
-        try:
-            os.remove(path)
-        except OSError as e:
-            print(f'Error: {e.filename} - {e.strerror}.')
-
-    # Then start from scratch by copying the template file
-    if not os.path.isfile(path):
-        shutil.copyfile('./album_template.txt', path)
-
     return path
 
 
-def get_all_artist_albums(artist_id):
-    """Function to get all albums by artist
+def get_artist_albums_page(artist_id, offset=0):
+    """Function that fetches one page of the artist's albums
 
     Args:
         artist_id (string): Tidal ID of the artist
+        offset (int): Index of the first album on the page
 
     Returns:
-        list: A list of dictionaries of artists' albums, with title and release date
+        dict: The JSON response
     """
 
     headers = build_headers()
 
-    url = f'https://openapi.tidal.com/artists/{artist_id}/albums?countryCode=US&limit=50'
-
-    try:
-        response = requests.get(url=url, headers=headers, timeout=(3, 5))
-        json_response = response.json()
-    except requests.exceptions.Timeout:
-        sys.exit("The request timed out")
-    except requests.exceptions.RequestException as e:
-        sys.exit(f"An error occurred: {e}")
-
-    all_albums = []
-
-    for i in json_response['data']:
-        if i['status'] == 451:
-            album = {
-                "title": "Not available",
-                "release_date": "Not available"
-            }
-            all_albums.append(album)
-        else:
-            if i['resource']['type'] == 'ALBUM':
-                album = {
-                    "title": i['resource']['title'],
-                    "release_date": i['resource']['releaseDate']
-                }
+    url = (f'https://openapi.tidal.com/artists/{artist_id}/albums?countryCode=US'
+           f'&offset={offset}&limit={c.DISCOGRAPHY_PAGE_SIZE}')
 
-                all_albums.append(album)
+    return http_client.get_json(url, headers=headers)
 
-    return all_albums
 
+def get_all_artist_albums(artist_id):
+    """Function to get all albums by artist
 
-def get_previous_album(current_album):
-    """Function to get previous album information
+    The discography is kept in the persistent index and only refreshed from the API
+    once it gets stale. The result is also cached in memory per artist ID, and
+    concurrent lookups of the same artist share a single refresh.
 
     Args:
-        current_album (dict): The album initially searched for
+        artist_id (string): Tidal ID of the artist
 
     Returns:
-        dict: If available, returns a dict with the title and release date of the previous album.
-       If not, returns None 
+        Discography: Artists' albums sorted by release date, with ID, title, release
+       date and type
     """
 
-    all_albums = get_all_artist_albums(current_album['artist_id'])
+    return shared_cache.discographies.get_or_fetch(
+        str(artist_id), partial(load_discography, artist_id))
 
-    if len(all_albums) == 1:
-        return None
 
-    current_album_index = get_album_index(current_album)
+def load_discography(artist_id):
+    """Helper function to read the discography from the index, refreshing it if stale
 
-    # Iterate over albums starting from the one after current_album
-    for album in all_albums[current_album_index + 1:]:
-        release_date_str = album['release_date']
+    Args:
+        artist_id (string): Tidal ID of the artist
 
-        # Check if the release date is 'Not available' - if it is, we assume it's a different
-        # album than current_album because the information was not available
-        if release_date_str == 'Not available':
-            return None
+    Returns:
+        Discography: Artists' albums sorted by release date
+    """
 
-        # If a valid release date is found, check that it's not the same album
-        if release_date_str:
-            if album['title'] == current_album['album_title']:
-                continue
+    index = get_discography_index()
 
-            previous_album = {
-                "title": album['title'],
-                # Use release date string directly if datetime parsing fails
-                "year": release_date_str.split('-')[0]
-            }
-            return previous_album
+    if not index.is_fresh(artist_id):
+        index.refresh(artist_id, get_artist_albums_page)
 
-    # Return None if no previous album is found
-    return None
+    return Discography(index.albums(artist_id))
 
 
-def get_next_album(current_album):
+def get_neighbour_albums(current_album):
+    """Function to get both the previous and the next album of the artist
+
+    Args:
+        current_album (dict): The album initially searched for
+
+    Returns:
+        tuple: Previous and next album as dicts with title and release year, None when
+       not available
+    """
+
     all_albums = get_all_artist_albums(current_album['artist_id'])
 
-    if len(all_albums) == 1:
-        return None
+    return find_neighbour_albums(all_albums, current_album)
 
-    current_album_index = get_album_index(current_album)
 
-    # Iterate over albums starting from the one after current_album
-    for album in reversed(all_albums[:current_album_index]):
-        release_date_str = album['release_date']
+def find_neighbour_albums(all_albums, current_album):
+    """Helper function to get the previous and the next album from an already fetched discography
 
-        # Check if the release date is 'Not available' - if it is, we assume it's a different
-        # album than current_album because the information was not available
-        if release_date_str == 'Not available':
-            return None
+    Args:
+        all_albums (Discography): Albums of the artist
+        current_album (dict): The album initially searched for
 
-        # If a valid release date is found, check that it's not the same album
-        if release_date_str:
-            if album['title'] == current_album['album_title']:
-                continue
+    Returns:
+        tuple: Previous and next album as dicts with title and release year, None when
+       not available
+    """
 
-            next_album = {
-                "title": album['title'],
-                # Use release date string directly if datetime parsing fails
-                "year": release_date_str.split('-')[0]
-            }
-            return next_album
+    neighbours = all_albums.neighbours(
+        current_album['album_id'], current_album['album_title'], current_album['release_date'])
 
-    # Return None if no previous album is found
-    return None
+    return tuple({"title": album['title'], "year": album['release_date'].split('-')[0]}
+                 if album else None for album in neighbours)
 
 
-def get_album_index(current_album):
-    all_albums = get_all_artist_albums(current_album['artist_id'])
+def get_album_id(url):
+    """Helper function to grab the album ID from a Tidal album link
 
-    # Find the index of the current album in the list
-    for i, album in enumerate(all_albums):
-        if album['title'] == current_album['album_title']:
-            return i
+    Args:
+        url (string): Tidal album link, for example: 'https://tidal.com/browse/album/102314585'
 
-    return None
+    Returns:
+        string: Tidal album ID
+    """
 
+    return url.split('/')[-1]
 
-def fill_album_info_box(album_info):
-    """Function that writes the information to the created file
+
+def get_tracks_url(url_id, offset=0):
+    """Helper function to build the API URL of one page of the album tracklist
 
     Args:
-        url_id (string): The last part of the Tidal browse album URL
+        url_id (string): Tidal album ID
+        offset (int): Index of the first track on the page
 
     Returns:
-        list: A list with the file path and the album data
+        string: API URL of the album items
     """
-    # Used to take url_id, toc, album_type, genres
-    # Grab the ID from the album link
-    url_id = album_info['link'].split('/')[-1]
 
+    return (f'https://openapi.tidal.com/albums/{url_id}/items?countryCode=US'
+            f'&offset={offset}&limit={c.TRACKS_PAGE_SIZE}')
+
+
+def fill_album_info_box(album_info, album_data=None, neighbours=None):
+    """Function that starts a new document with the filled in album info box
+
+    Args:
+        album_info (dict): Album information from the form
+        album_data (dict, optional): Already fetched album data, fetched here if not given
+        neighbours (tuple, optional): Already fetched previous and next album
+
+    Returns:
+        list: A list with the document and the album data
+    """
     # Get artist and album name, duration, release date and previous album title and release date
-    album_data = get_release_information(url_id)
-    previous_album = get_previous_album(album_data)
-    next_album = get_next_album(album_data)
-
-    # Create new file from template
-    file = construct_path(album_data['artist'], album_data['album_title'])
-
-    genres = album_info['genres']
-
-    if genres:
-        for i, genre in enumerate(genres):
-            genres[i] = f"[[{genre.strip()}]]"
-
-    gen_string = ', '.join(genres) if len(genres) > 1 else genres[0]   
-
-    # Open the txt file
-    with open(file, 'r', encoding='utf-8') as f:
-        # Read the contents of the file
-        contents = f.read()
-
-    # Define the lines we want to modify and the new content to replace them with
-    lines_to_modify = [
-        ' | levy              = ',
-        ' | tyyppi            = ',
-        ' | artisti           = ',
-        ' | julkaistu         = ',
-        ' | tuottaja          = ',
-        ' | äänitetty         = ',
-        ' | studio            = ',
-        ' | genre             = ',
-        ' | minuutit          = ',
-        ' | sekunnit          = ',
-        ' | tämä              = ',
-        ' | vuosit            = ',
-        ' | edellinen         = ',
-        ' | vuosie            = ',
-        ' | seuraava          = ',
-        ' | vuosis            = ',
-        '}}'
-    ]
-
-    new_content = [
-        album_data['album_title'],
-        album_info['type'].lower() if album_info['type'] else '',
-        album_data['artist'],
-        album_data['full_date'],
-        album_info['producer'] if album_info['producer'] else '',
-        album_info['recorded'] if album_info['recorded'] else '',
-        album_info['studio'] if album_info['studio'] else '',
-        gen_string,
-        str(album_data['total_min']),
-        str(album_data['total_sec']).zfill(2),
-        album_data['album_title'],
-        album_data['release_year'],
-        previous_album['title'] if previous_album else '',
-        previous_album['year'] if previous_album else '',
-        next_album['title'] if next_album else '',
-        next_album['year'] if next_album else '',
-        '__NOTOC__' if not album_info['toc'] else ''
-    ]
-
-    # Loop through each line, replace with the new content, and update the contents variable
-    keywords = ['artisti', 'edellinen', 'seuraava']
-    for i, line_to_modify in enumerate(lines_to_modify):
-        if any(keyword in line_to_modify for keyword in keywords) and new_content[i]:
-            contents = contents.replace(
-                line_to_modify, f'{line_to_modify}[[{new_content[i]}]]')
-        else:
-            contents = contents.replace(
-                line_to_modify, f'{line_to_modify}{new_content[i]}')
+    if album_data is None:
+        album_data = get_release_information(get_album_id(album_info['link']))
+    if neighbours is None:
+        neighbours = get_neighbour_albums(album_data)
+
+    previous_album, next_album = neighbours
+
+    # Blank genres (ie. an empty form field) are left out instead of becoming [[]]
+    genres = [f"[[{genre.strip()}]]" for genre in album_info['genres'] if genre.strip()]
+
+    gen_string = ', '.join(genres)
+
+    values = {
+        'levy': album_data['album_title'],
+        'tyyppi': album_info['type'].lower() if album_info['type'] else '',
+        'artisti': album_data['artist'],
+        'julkaistu': album_data['full_date'],
+        'tuottaja': album_info['producer'],
+        'äänitetty': album_info['recorded'],
+        'studio': album_info['studio'],
+        'genre': gen_string,
+        'minuutit': album_data['total_min'],
+        'sekunnit': str(album_data['total_sec']).zfill(2),
+        'tämä': album_data['album_title'],
+        'vuosit': album_data['release_year'],
+        'edellinen': previous_album['title'] if previous_album else '',
+        'vuosie': previous_album['year'] if previous_album else '',
+        'seuraava': next_album['title'] if next_album else '',
+        'vuosis': next_album['year'] if next_album else ''
+    }
+
+    contents = ALBUM_INFOBOX.render(values)
 
-    # Write the modified contents back to the file
-    with open(file, 'w', encoding='utf-8') as f:
-        f.write(contents)
+    if not album_info['toc']:
+        contents += '__NOTOC__'
 
-    return [file, album_data]
+    return [WikiDocument(contents), album_data]
 
 
-def fill_tracklist(url, file, album):
-    """Function that writes the track list information to the file
+def fill_tracklist(url, doc, album, tracklist=None):
+    """Function that writes the track list information to the document
 
     Args:
-        url_id (string): The last part of the Tidal browse album URL
-        file_and_album (list): File path and album data
+        url (string): Tidal album link
+        doc (WikiDocument): Document being built
+        album (dict): Album data
+        tracklist (list, optional): Already fetched tracklist, fetched here if not given
     """
 
-    # Grab the ID from the album link
-    url_id = url.split('/')[-1]
+    if tracklist is None:
+        tracklist = get_tracklist(get_album_id(url))
 
-    # Grab tracklist
-    tracks_url = f'https://openapi.tidal.com/albums/{url_id}/items?countryCode=US&offset=0&limit=30'
+    # Split the tracks by disc, keeping the order they came in
+    discs = {}
+    for track in tracklist:
+        discs.setdefault(track.get('disc_number', 1), []).append(track)
 
-    tracklist = get_tracklist(tracks_url)
+    doc.write('\n\n== Kappaleet ==')
 
-    # Append the start of the tracklist module to the file
-    with open(file, 'a', encoding='utf-8') as f:
-        f.write('\n\n== Kappaleet ==')
-        f.write('\n{{Kappalelista')
-        f.write(
-            f'\n | kokonaiskesto    = {album["total_min"]}.{album["total_sec"]:02d}')
+    for disc_number, tracks in discs.items():
+        # Start of the tracklist module
+        doc.write('\n{{Kappalelista')
 
-    # Then the actual tracks one by one
-    for track in tracklist:
-        with open(file, 'a', encoding='utf-8') as fd:
+        if len(discs) > 1:
+            disc_seconds = sum(track['track_minutes'] * 60 + track['track_seconds']
+                               for track in tracks)
+            disc_min, disc_sec = divmod(disc_seconds, 60)
+            doc.write(f'\n | otsikko          = Levy {disc_number}')
+            doc.write(f'\n | kokonaiskesto    = {disc_min}.{disc_sec:02d}')
+        else:
+            doc.write(
+                f'\n | kokonaiskesto    = {album["total_min"]}.{album["total_sec"]:02d}')
+
+        # Then the actual tracks one by one
+        for track in tracks:
             # Format the track duration string with leading zero for single-digit seconds
             track_duration = f'{track["track_minutes"]}.{track["track_seconds"]:02d}'
-            fd.write(
+            doc.write(
                 f'\n | nimi{track["track_number"]}           = {track["track_title"]}')
-            fd.write(f'\n | huom{track["track_number"]}           = ')
-            fd.write(
+            doc.write(f'\n | huom{track["track_number"]}           = ')
+            doc.write(
                 f'\n | pituus{track["track_number"]}         = {track_duration}')
-            fd.write('\n')
+            doc.write('\n')
 
-    # Add closing curly braces for the tracklist part of the template
-    with open(file, 'a', encoding='utf-8') as f:
-        f.write('}}\n')
+        # Add closing curly braces for the tracklist part of the template
+        doc.write('}}\n')
 
 
-def fill_lineup(file, members):
-    """Function that writes lineup parts to the output file
+def fill_lineup(doc, members):
+    """Function that writes lineup parts to the document
 
     Args:
-        file_and_album (list): File path and album data
+        doc (WikiDocument): Document being built
+        members (list): Members with their name and instruments
     """
 
     # Add lineup parts
 
-    with open(file, 'a', encoding='utf-8') as f:
-        f.write('\n== Kokoonpano ==\n')
+    doc.write('\n== Kokoonpano ==\n')
 
     if members:
         for member in members:
@@ -446,27 +515,139 @@ def fill_lineup(file, members):
                 for instrument in instruments:
                     instruments_str = instruments_str + f"[[{instrument}]], "
                 instruments_str = instruments_str[:-2]
-            with open(file, 'a', encoding='utf-8') as f:
-                f.write(f"* [[{member['name']}]] - {instruments_str}\n")
+            doc.write(f"* [[{member['name']}]] - {instruments_str}\n")
+
+
+def get_domain_limit(domain):
+    """Helper function to get the semaphore limiting concurrent requests to a review site
+
+    Args:
+        domain (string): Domain of the review site
+
+    Returns:
+        threading.BoundedSemaphore: Semaphore shared by every request to the domain
+    """
 
+    with domain_limits_lock:
+        limit = domain_limits.get(domain)
+        if limit is None:
+            limit = threading.BoundedSemaphore(c.REVIEW_DOMAIN_CONCURRENCY)
+            domain_limits[domain] = limit
 
-def add_reviews(reviews, file):
+    return limit
 
-    with open(file, 'a', encoding='utf-8') as f:
-        f.write('\n')
-        f.write('== Arvostelut ==\n')
 
-    for review in reviews:
-        r = get_review(review)
+def fetch_review(review_url):
+    """Function that fetches a single review, respecting the per-domain concurrency cap
+
+    While the circuit breaker of the site is open, the site is not contacted and the
+    cached review is used instead, if there is one. Only timeouts and connection or
+    server errors count against the breaker, a page we can't parse only costs its own
+    review.
+
+    Args:
+        review_url (string): Link to the review
+
+    Returns:
+        string: Rating and reference for the review, None if it could not be fetched
+    """
+
+    domain = get_domain(review_url)
+    breaker = get_breaker(domain)
+
+    if not breaker.allow():
+        print(f'Error: {domain} is failing, skipping review {review_url}')
+        return get_cached_review(review_url)
+
+    with get_domain_limit(domain):
+        try:
+            review = get_review(review_url)
+        except (RequestTimeoutError, UpstreamError) as e:
+            # A failing site should only cost us its own review, not the whole page
+            breaker.record_failure()
+            print(f'Error: could not fetch review {review_url}: {e}')
+            return get_cached_review(review_url)
+        except Exception as e:
+            # The site answered, so it's healthy even if this page didn't parse
+            breaker.record_success()
+            print(f'Error: could not read review {review_url}: {e}')
+            return get_cached_review(review_url)
+
+    breaker.record_success()
+    return review
+
+
+def fetch_reviews(reviews, deadline=None):
+    """Function that fetches reviews concurrently
+
+    Whatever hasn't arrived by the deadline is left out, so one slow site can't hold
+    up the whole page. The links that missed it are returned so they can be reported.
+
+    Args:
+        reviews (list): Links to the reviews
+        deadline (float, optional): Seconds to wait for the reviews, defaults to
+           constants.REVIEW_DEADLINE
+
+    Returns:
+        tuple: Rating and reference strings in the same order as the links, None for
+       reviews that could not be fetched in time, and the links that missed the deadline
+    """
+
+    if not reviews:
+        return [], []
+
+    if deadline is None:
+        deadline = c.REVIEW_DEADLINE
+
+    executor = ThreadPoolExecutor(max_workers=min(c.REVIEW_WORKERS, len(reviews)))
+    futures = [executor.submit(fetch_review, review) for review in reviews]
+
+    wait(futures, timeout=deadline)
+    # Don't wait for the stragglers, they finish in the background
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    missing = []
+    for review, future in zip(reviews, futures):
+        if future.done() and not future.cancelled():
+            results.append(future.result())
+        else:
+            results.append(None)
+            missing.append(review)
+
+    return results, missing
+
+
+def add_reviews(reviews, doc, fetched=None):
+    """Function that writes the reviews to the document
+
+    Args:
+        reviews (list): Links to the reviews
+        doc (WikiDocument): Document being built
+        fetched (list, optional): Already fetched reviews, fetched here if not given
+
+    Returns:
+        list: Links to the reviews that missed the deadline
+    """
+
+    missing = []
+
+    doc.write('\n')
+    doc.write('== Arvostelut ==\n')
+
+    if fetched is None:
+        fetched, missing = fetch_reviews(reviews)
+
+    for r in fetched:
         if r:
-            with open(file, 'a', encoding='utf-8') as f:
-                f.write(r + '\n')
+            doc.write(r + '\n')
+
+    return missing
 
 
-def add_references(file):
-    with open(file, 'a', encoding='utf-8') as f:
-        f.write('\n== Lähteet ==\n')
-        f.write('{{viitteet}}\n')
+def add_references(doc):
+    doc.write('\n== Lähteet ==\n')
+    doc.write('{{viitteet}}\n')
 
 
 def is_valid_url(review_url):
@@ -484,11 +665,10 @@ def get_reviews(review_list):
     return reviews
 
 
-def add_external_links(external_links, file, album):
+def add_external_links(external_links, doc, album):
     album = album['album_title']
 
-    with open(file, 'a', encoding='utf-8') as f:
-        f.write('\n== Aiheesta muualla ==\n')
+    doc.write('\n== Aiheesta muualla ==\n')
 
     links = []
 
@@ -508,26 +688,31 @@ def add_external_links(external_links, file, album):
             links.append(ext_link)
 
     for link in links:
-        with open(file, 'a', encoding='utf-8') as f:
-            f.write(f"{link}\n")
+        doc.write(f"{link}\n")
+
 
+def export_wiki_template(doc, path=None):
+    """Function that returns the finished template, writing it to disk if asked
+
+    Args:
+        doc (WikiDocument): Document being built
+        path (string, optional): Where to save the template
+
+    Returns:
+        string: The wiki template
+    """
 
-def export_wiki_template(file):
-    with open(file, 'r', encoding='utf-8') as f:
-        # Read the contents of the file
-        contents = f.read()
+    if path:
+        doc.save(path)
 
-    return contents
+    return doc.getvalue()
 
 
-def add_stub(file):
-    with open(file, 'a', encoding='utf-8') as f:
-        f.write(f"\n{{{{Tynkä/Albumi}}}}\n")
+def add_stub(doc):
+    doc.write(f"\n{{{{Tynkä/Albumi}}}}\n")
 
 
-def add_classes(file, classes):
-    with open(file, 'a', encoding="utf-8") as f:
-        f.write("\n")
+def add_classes(doc, classes):
+    doc.write("\n")
     for class_ in classes:
-        with open(file, 'a', encoding="utf-8") as f:
-            f.write(f"[[Luokka:{class_}]]\n")
+        doc.write(f"[[Luokka:{class_}]]\n")
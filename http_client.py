@@ -0,0 +1,311 @@
+"""Module that hosts the shared HTTP client
+
+Every outgoing request goes through a pooled session per host, so the TCP and TLS
+handshakes are paid once and the connections are kept alive between calls. Hosts
+listed in constants.RATE_LIMITS are also throttled by a shared token bucket, and
+GET responses are kept in a disk-backed cache. Transient failures are retried here,
+and whatever still fails is raised as one of the errors in errors.py.
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+import constants as c
+from errors import (NotFoundError, ParseError, RateLimitedError, RequestTimeoutError,
+                    UnavailableError, UpstreamError)
+from rate_limiter import TokenBucket, parse_retry_after
+from response_cache import ResponseCache
+
+sessions = {}
+sessions_lock = threading.Lock()
+
+# Rate limiters are shared by every thread and Streamlit session in the process
+limiters = {host: TokenBucket(rate, burst)
+            for host, (rate, burst) in c.RATE_LIMITS.items()}
+
+# Created on first use, so importing the module doesn't create the cache directory
+response_cache = None
+response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Helper function to get the shared response cache, creating it on first use
+
+    Returns:
+        ResponseCache: The response cache shared by every request in this process
+    """
+
+    global response_cache
+
+    if response_cache is None:
+        with response_cache_lock:
+            if response_cache is None:
+                response_cache = ResponseCache(c.RESPONSE_CACHE_DIR, c.RESPONSE_CACHE_MAX_SIZE)
+
+    return response_cache
+
+
+def create_session(host):
+    """Helper function to create a session with a connection pool sized for the host
+
+    Args:
+        host (string): Host name the session will be used for
+
+    Returns:
+        requests.Session: A new session
+    """
+
+    pool_maxsize = c.HTTP_POOL_SIZES.get(host, c.HTTP_POOL_MAXSIZE)
+    adapter = HTTPAdapter(pool_connections=c.HTTP_POOL_CONNECTIONS,
+                          pool_maxsize=pool_maxsize)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
+
+
+def get_session(url):
+    """Function that returns the shared session for the host of the URL
+
+    Args:
+        url (string): URL the request will be sent to
+
+    Returns:
+        requests.Session: Pooled session for the host
+    """
+
+    host = urlparse(url).netloc
+
+    with sessions_lock:
+        session = sessions.get(host)
+        if session is None:
+            session = create_session(host)
+            sessions[host] = session
+
+    return session
+
+
+def send(session, method, url, **kwargs):
+    """Function that sends a request, retrying timeouts, connection errors and 5xx responses
+
+    Args:
+        session (requests.Session): Session to send the request with
+        method (string): HTTP method
+        url (string): URL to send the request to
+
+    Returns:
+        requests.Response: The response
+    """
+
+    for attempt in range(c.HTTP_RETRIES + 1):
+        error = None
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.exceptions.Timeout:
+            error = RequestTimeoutError(f'The request to {url} timed out')
+        except requests.exceptions.RequestException as e:
+            error = UpstreamError(f'The request to {url} failed: {e}')
+        else:
+            if response.status_code not in c.HTTP_RETRY_STATUSES:
+                return response
+
+        if attempt < c.HTTP_RETRIES:
+            # Hand a streamed connection back to the pool before trying again
+            if error is None:
+                response.close()
+            time.sleep(c.HTTP_BACKOFF * 2 ** attempt)
+
+    if error:
+        raise error
+
+    return response
+
+
+def check_response(response):
+    """Function that raises the matching error for a failed response
+
+    Args:
+        response (requests.Response): The response
+
+    Returns:
+        requests.Response: The response, if it didn't fail
+    """
+
+    status = response.status_code
+
+    if status < 400:
+        return response
+
+    # Nobody reads the body of a failed response, so don't keep a streamed connection
+    response.close()
+
+    if status == 404:
+        raise NotFoundError(f'{status}: The requested resource {response.url} could not be found')
+    if status == 451:
+        raise UnavailableError(f'{status}: Unavailable due to demand from the right-holders to '
+                               'prohibit access to the resource.')
+    if status == 429:
+        raise RateLimitedError(f'{status}: Too many requests to {response.url}',
+                               parse_retry_after(response.headers.get('Retry-After'), None))
+
+    raise UpstreamError(f'{status}: Something went wrong, please try again later')
+
+
+def request(method, url, **kwargs):
+    """Function that sends a request through the pooled session of the host
+
+    Args:
+        method (string): HTTP method
+        url (string): URL to send the request to
+
+    Returns:
+        requests.Response: The response
+    """
+
+    kwargs.setdefault('timeout', c.HTTP_TIMEOUT)
+
+    session = get_session(url)
+    limiter = limiters.get(urlparse(url).netloc)
+
+    if limiter is None:
+        return check_response(send(session, method, url, **kwargs))
+
+    for _ in range(c.RATE_LIMIT_RETRIES):
+        limiter.acquire()
+        response = send(session, method, url, **kwargs)
+
+        if response.status_code != 429:
+            return check_response(response)
+
+        response.close()
+
+        # Make every caller of this host back off, not just this one
+        limiter.pause(parse_retry_after(
+            response.headers.get('Retry-After'), c.RATE_LIMIT_DEFAULT_WAIT))
+
+    limiter.acquire()
+    return check_response(send(session, method, url, **kwargs))
+
+
+def build_cached_response(url, meta, body):
+    """Helper function to turn a cache entry back into a response
+
+    Args:
+        url (string): URL of the request
+        meta (dict): Cached status, headers and encoding
+        body (bytes): Cached body
+
+    Returns:
+        requests.Response: The cached response
+    """
+
+    response = requests.Response()
+    response.url = url
+    response.status_code = meta['status_code']
+    response.headers = CaseInsensitiveDict(meta['headers'])
+    response.encoding = meta['encoding']
+    response._content = body
+    # Lets iter_content hand out the cached body for streamed requests
+    response._content_consumed = True
+    response.from_cache = True
+
+    return response
+
+
+def get(url, cache=True, **kwargs):
+    """Function that sends a GET request, answering from the response cache when possible
+
+    Fresh entries are returned without touching the network. Stale entries are
+    revalidated with If-None-Match/If-Modified-Since, and a 304 reuses the cached body.
+    Streamed responses are not stored here, since the caller may stop reading early.
+    Pass the body to cache_response once it has been read in full.
+
+    Args:
+        url (string): URL to send the request to
+        cache (bool): Whether the response cache is used
+
+    Returns:
+        requests.Response: The response
+    """
+
+    if not cache:
+        return request('GET', url, **kwargs)
+
+    ttl = c.RESPONSE_CACHE_TTLS.get(urlparse(url).netloc, c.RESPONSE_CACHE_DEFAULT_TTL)
+    cached = get_response_cache().get(url)
+
+    if cached:
+        meta, body = cached
+        if time.time() - meta['stored_at'] < ttl:
+            return build_cached_response(url, meta, body)
+
+        headers = dict(kwargs.get('headers') or {})
+        if meta['etag']:
+            headers['If-None-Match'] = meta['etag']
+        if meta['last_modified']:
+            headers['If-Modified-Since'] = meta['last_modified']
+        kwargs['headers'] = headers
+
+    response = request('GET', url, **kwargs)
+
+    if response.status_code == 304 and cached:
+        get_response_cache().touch(url)
+        return build_cached_response(url, *cached)
+
+    if response.status_code == 200 and not kwargs.get('stream'):
+        cache_response(url, response, response.content)
+
+    return response
+
+
+def cache_response(url, response, body):
+    """Function that stores a fully read response in the response cache
+
+    Args:
+        url (string): URL of the request
+        response (requests.Response): The response
+        body (bytes): The whole body of the response
+    """
+
+    if response.status_code == 200 and not getattr(response, 'from_cache', False):
+        get_response_cache().set(url, response.status_code, response.headers,
+                           response.encoding, body)
+
+
+def get_json(url, **kwargs):
+    """Function that sends a GET request and decodes the JSON response
+
+    Args:
+        url (string): URL to send the request to
+
+    Returns:
+        dict: The decoded response
+    """
+
+    response = get(url, **kwargs)
+
+    try:
+        return response.json()
+    except ValueError as e:
+        raise ParseError(f'The response from {url} is not valid JSON') from e
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def close():
+    """Function that closes every pooled session
+    """
+
+    with sessions_lock:
+        for session in sessions.values():
+            session.close()
+        sessions.clear()
@@ -0,0 +1,76 @@
+"""Module that hosts the precompiled album info box template
+"""
+
+import os.path
+import re
+
+# Fields whose value is turned into an intra-wiki link
+LINKED_FIELDS = {'artisti', 'edellinen', 'seuraava'}
+
+# Matches the template parameter lines, ie. ' | levy              = '
+SLOT_PATTERN = re.compile(r'^ \| (?P<name>.+?) +=[ \t]*$', re.MULTILINE)
+
+
+class Slot:
+    """Named field of the template
+
+    Args:
+        name (string): Name of the template parameter
+        link (bool): Whether a filled value is wrapped into a wikilink
+    """
+
+    def __init__(self, name, link=False) -> None:
+        self.name = name
+        self.link = link
+
+    def format(self, value):
+        if value is None or value == '':
+            return ''
+        if self.link:
+            return f'[[{value}]]'
+        return str(value)
+
+
+class CompiledTemplate:
+    """Template parsed once into literal text and named slots
+
+    Rendering is a single pass over the parts, no matter how many fields are filled.
+    """
+
+    def __init__(self, text, linked_fields=()) -> None:
+        self.parts = []
+        self.slots = {}
+
+        position = 0
+        for match in SLOT_PATTERN.finditer(text):
+            slot = Slot(match['name'], match['name'] in linked_fields)
+            self.parts.append((text[position:match.end()], slot))
+            self.slots[slot.name] = slot
+            position = match.end()
+
+        self.tail = text[position:]
+
+    def render(self, values):
+        """Function that fills the template
+
+        Args:
+            values (dict): Slot names mapped to their values, missing slots are left empty
+
+        Returns:
+            string: The filled template
+        """
+
+        rendered = [literal + slot.format(values.get(slot.name))
+                    for literal, slot in self.parts]
+        rendered.append(self.tail)
+
+        return ''.join(rendered)
+
+
+def load_template(path, linked_fields=()):
+    with open(path, 'r', encoding='utf-8') as f:
+        return CompiledTemplate(f.read(), linked_fields)
+
+
+ALBUM_INFOBOX = load_template(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'album_template.txt'), LINKED_FIELDS)
@@ -0,0 +1,90 @@
+"""Module that hosts the token bucket rate limiter used for API requests
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """Thread safe token bucket
+
+    Tokens are added at a steady rate up to the burst size, and every request takes
+    one. When the bucket is empty, callers wait until the next token is available.
+    """
+
+    def __init__(self, rate, burst) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens +
+                          (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Function that blocks until a token is available and takes it
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Function that stops handing out tokens for the given time, ie. after a 429
+
+        Args:
+            seconds (float): How long to wait before the next request
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0
+            self.updated = now
+
+
+def parse_retry_after(value, default):
+    """Helper function to parse a Retry-After header
+
+    Args:
+        value (string): Header value, either seconds or an HTTP date
+        default (float): Wait used if the header is missing or invalid
+
+    Returns:
+        float: Seconds to wait
+    """
+
+    if not value:
+        return default
+
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+    return max(0, (retry_at - datetime.now(timezone.utc)).total_seconds())
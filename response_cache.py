@@ -0,0 +1,143 @@
+"""Module that hosts the disk-backed HTTP response cache
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from document import atomic_write
+
+
+class ResponseCache:
+    """Size bounded cache of HTTP responses stored on disk
+
+    Every entry is a body file and a JSON file holding the status, headers and the
+    validators needed to revalidate it. Once the cache grows over its maximum size,
+    the least recently used entries are removed.
+
+    Args:
+        directory (string): Directory the entries are stored in
+        max_size (int): Maximum total size of the bodies in bytes
+    """
+
+    def __init__(self, directory, max_size) -> None:
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # Measured on the first write, so creating the cache doesn't scan the directory
+        self.size = None
+
+    def measure(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                   if entry.name.endswith('.body'))
+
+    def paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    def get(self, url):
+        """Function that returns the cached entry of the URL
+
+        Args:
+            url (string): URL of the request
+
+        Returns:
+            tuple: Entry metadata and body, None if the URL is not cached
+        """
+
+        meta_path, body_path = self.paths(url)
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+
+        # The body's modification time doubles as the last access time for eviction
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+
+        return meta, body
+
+    def set(self, url, status_code, headers, encoding, body):
+        """Function that stores a response
+
+        Args:
+            url (string): URL of the request
+            status_code (int): Status code of the response
+            headers (dict): Response headers
+            encoding (string): Encoding of the body
+            body (bytes): Response body
+        """
+
+        meta_path, body_path = self.paths(url)
+        meta = {
+            'url': url,
+            'status_code': status_code,
+            'headers': dict(headers),
+            'encoding': encoding,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'stored_at': time.time()
+        }
+
+        try:
+            old_size = os.path.getsize(body_path)
+        except OSError:
+            old_size = 0
+
+        atomic_write(body_path, body, 'wb')
+        atomic_write(meta_path, json.dumps(meta))
+
+        with self.lock:
+            if self.size is None:
+                self.size = self.measure()
+            else:
+                self.size += len(body) - old_size
+            if self.size > self.max_size:
+                self.evict()
+
+    def touch(self, url):
+        """Function that marks an entry fresh again after it was revalidated
+
+        Args:
+            url (string): URL of the request
+        """
+
+        cached = self.get(url)
+        if cached is None:
+            return
+
+        meta, _ = cached
+        meta['stored_at'] = time.time()
+        atomic_write(self.paths(url)[0], json.dumps(meta))
+
+    def evict(self):
+        # Drop the least recently used entries until we're well under the limit
+        if self.size is None:
+            self.size = self.measure()
+
+        bodies = sorted((entry for entry in os.scandir(self.directory)
+                         if entry.name.endswith('.body')),
+                        key=lambda entry: entry.stat().st_mtime)
+        target = self.max_size * 0.9
+
+        for entry in bodies:
+            if self.size <= target:
+                break
+            size = entry.stat().st_size
+            for path in (entry.path, entry.path[:-len('.body')] + '.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.size -= size
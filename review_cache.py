@@ -0,0 +1,86 @@
+"""Module that hosts the persistent cache of extracted review records
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS reviews (
+    url       TEXT PRIMARY KEY,
+    record    TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+'''
+
+
+def normalise_url(url):
+    """Helper function to normalise a review URL so the same review always gets the same key
+
+    Lowercases the scheme and host, drops the fragment, tracking parameters and the
+    trailing slash, and sorts the query.
+
+    Args:
+        url (string): Link to the review
+
+    Returns:
+        string: Normalised URL
+    """
+
+    parts = urlsplit(url.strip())
+    query = sorted((key, value) for key, value in parse_qsl(parts.query)
+                   if not key.startswith('utm_'))
+
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                       parts.path.rstrip('/') or '/', urlencode(query), ''))
+
+
+class ReviewCache:
+    """Extracted review records stored in a local SQLite database
+
+    Args:
+        path (string): Path to the database file
+        ttl (int): Seconds a record is used before the review is parsed again
+    """
+
+    def __init__(self, path, ttl) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock, self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def get(self, url, stale=False):
+        """Function that returns the cached record of the review
+
+        Args:
+            url (string): Link to the review
+            stale (bool): Whether an expired record is returned too
+
+        Returns:
+            dict: Title, author, date, rating and domain, None if not cached or expired
+        """
+
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT record, stored_at FROM reviews WHERE url = ?',
+                (normalise_url(url),)).fetchone()
+
+        if row is None or (not stale and time.time() - row[1] >= self.ttl):
+            return None
+
+        return json.loads(row[0])
+
+    def set(self, url, record):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO reviews VALUES (?, ?, ?)',
+                (normalise_url(url), json.dumps(record), time.time()))
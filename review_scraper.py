@@ -1,12 +1,54 @@
+import argparse
 import sys
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
-from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
+from datetime import date, datetime
+from functools import cache
 import constants as c
-import platform
-import re
-from fake_useragent import UserAgent
+import http_client
+import shared_cache
+from errors import ParseError, WaferError
+from extractors import get_extractor, convert_date
+from review_cache import ReviewCache, normalise_url
+from user_agents import get_user_agent
+
+# Opened on first use, so importing the module doesn't touch the disk
+review_cache = None
+review_cache_lock = threading.Lock()
+
+
+def get_review_cache():
+    """Helper function to get the shared review cache, opening it on first use
+
+    Returns:
+        ReviewCache: The review cache shared by every scrape in this process
+    """
+
+    global review_cache
+
+    if review_cache is None:
+        with review_cache_lock:
+            if review_cache is None:
+                review_cache = ReviewCache(c.REVIEW_CACHE_PATH, c.REVIEW_CACHE_TTL)
+
+    return review_cache
+
+
+@cache
+def get_html_parser():
+    """Helper function to pick the HTML parser, lxml if it's installed
+
+    Checked on the first parse, so code that never scrapes a review doesn't import it.
+    """
+
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
 
 
 def get_domain(review_url):
@@ -17,33 +59,62 @@ def get_domain(review_url):
 
 def get_review(review_url):
     domain = get_domain(review_url)
-    ua = UserAgent()
-    headers = {'user-agent': f'{ua.random}'}
+    extractor = get_extractor(domain)
 
-    if domain not in c.SUPPORTED_DOMAINS:
+    if extractor is None:
         return None
 
-    try:
-        response = requests.get(url=review_url, headers=headers, timeout=(3, 5))
-        soup = BeautifulSoup(response.text, 'html.parser')
-    except requests.exceptions.Timeout:
-        sys.exit("The request timed out")
-    except requests.exceptions.RequestException as e:
-        sys.exit("An error occurred:", e)
-
-    title = get_review_title(soup, domain)
-    author = get_review_author(soup, domain)
-    date = get_review_date(soup, domain)
-    rating = get_review_rating(soup, domain)
-
-    review = {
-        "title": title,
-        "author": author,
-        "date": date,
-        "rating": rating,
-        "url": review_url,
-        "domain": domain
-    }
+    # Everyone asking for the same review at the same time shares one scrape
+    record = shared_cache.reviews.get_or_fetch(
+        normalise_url(review_url), lambda: load_review(review_url, extractor),
+        keep=lambda record: bool(record['rating']))
+
+    return format_review(record, review_url)
+
+
+def load_review(review_url, extractor):
+    """Function that reads a review record from the disk cache, scraping it if needed
+
+    Args:
+        review_url (string): Link to the review
+        extractor (ReviewExtractor): Extractor of the review site
+
+    Returns:
+        dict: Title, author, date, rating and domain of the review
+    """
+
+    record = get_review_cache().get(review_url)
+
+    if record is None:
+        record = scrape_review(review_url, extractor)
+        # Only complete reviews are worth keeping
+        if record['rating']:
+            get_review_cache().set(review_url, record)
+
+    return record
+
+
+def get_cached_review(review_url):
+    """Function that builds the review from the cache only, even if the record is stale
+
+    Args:
+        review_url (string): Link to the review
+
+    Returns:
+        string: Rating and reference for the review, None if it's not cached
+    """
+
+    record = get_review_cache().get(review_url, stale=True)
+
+    if record is None or get_extractor(record['domain']) is None:
+        return None
+
+    return format_review(record, review_url)
+
+
+def format_review(record, review_url):
+    # The reference is rebuilt every time so the access date stays current
+    review = dict(record, url=review_url)
 
     rating = create_album_rating(review)
     reference = create_reference(review)
@@ -56,165 +127,314 @@ def get_review(review_url):
     return None
 
 
-def create_album_rating(review):
-    split_domain = review['domain'].split('.')
-    if split_domain[0] == 'metalinjection':
-        site = 'Metal Injection'
-    else:
-        site = split_domain[0].title() if len(
-            split_domain) == 2 else split_domain[1].title()
-    
-    if site == 'Angrymetalguy':
-        site = 'Angry Metal Guy'
-    elif site == 'Distortedsoundmag':
-        site = 'Distorted Sound Magazine'
-    elif site == 'Loudersound':
-        site = 'Metal Hammer'
-
-    max_5 = ['kaaoszine.fi', 'www.soundi.fi', 'www.inferno.fi', 'www.metalsucks.net',
-             'www.angrymetalguy.com', 'www.loudersound.com']
-
-    max_rating = 5 if review['domain'] in max_5 else 10
-    if not review['rating']:
+def scrape_review(review_url, extractor):
+    """Function that downloads a review and extracts its details
+
+    Args:
+        review_url (string): Link to the review
+        extractor (ReviewExtractor): Extractor of the review site
+
+    Returns:
+        dict: Title, author, date, rating and domain of the review
+    """
+
+    headers = {'user-agent': get_user_agent(extractor.domain)}
+
+    if c.REVIEW_STREAMING and extractor.markers:
+        return scrape_streamed(review_url, extractor, headers)
+
+    response = http_client.get(review_url, headers=headers)
+
+    try:
+        return extract_review(response.text, extractor, extractor.strainer)
+    except (AttributeError, IndexError, KeyError, TypeError):
+        # The page didn't look like we expected, try again with the whole tree
+        return extract_full_review(response.text, extractor, review_url)
+
+
+def scrape_streamed(review_url, extractor, headers):
+    """Function that downloads a review only as far as needed and extracts its details
+
+    The page is read in chunks until every marker of the site has been seen, plus one
+    more chunk so the last element is complete. If a field turns out to be missing,
+    the rest of the page is read from the same response and the whole page is parsed.
+
+    Fresh pages in the response cache are read from disk, and stale ones are
+    revalidated. Only fully downloaded pages are stored, a page cut short at the
+    markers is covered by the review record cache instead.
+
+    Args:
+        review_url (string): Link to the review
+        extractor (ReviewExtractor): Extractor of the review site
+        headers (dict): Request headers
+
+    Returns:
+        dict: Title, author, date, rating and domain of the review
+    """
+
+    response = http_client.get(review_url, headers=headers, stream=True)
+
+    try:
+        chunks = response.iter_content(c.REVIEW_STREAM_CHUNK_SIZE)
+        body = read_until_markers(chunks, extractor.marker_bytes)
+        encoding = response.encoding or 'utf-8'
+
+        try:
+            return extract_review(body.decode(encoding, errors='replace'),
+                                  extractor, extractor.strainer)
+        except (AttributeError, IndexError, KeyError, TypeError):
+            body += b''.join(chunks)
+            http_client.cache_response(review_url, response, body)
+            return extract_full_review(body.decode(encoding, errors='replace'), extractor,
+                                       review_url)
+    finally:
+        response.close()
+
+
+def read_until_markers(chunks, markers):
+    """Helper function to read chunks until every marker has been seen, and one more chunk
+
+    Args:
+        chunks (iterator): Chunks of the response body
+        markers (list): Byte strings to look for
+
+    Returns:
+        bytes: What was read
+    """
+
+    pending = set(markers)
+    overlap = max(len(marker) for marker in markers)
+    body = bytearray()
+
+    for chunk in chunks:
+        # Markers may be split between chunks, so look at the end of the previous one too
+        window = bytes(body[-overlap:]) + chunk
+        body += chunk
+
+        if not pending:
+            break
+
+        pending = {marker for marker in pending if marker not in window}
+
+    return bytes(body)
+
+
+def extract_full_review(html, extractor, review_url):
+    """Function that extracts the review details from the whole page
+
+    Args:
+        html (string): The review page
+        extractor (ReviewExtractor): Extractor of the review site
+        review_url (string): Link to the review
+
+    Returns:
+        dict: Title, author, date, rating and domain of the review
+    """
+
+    try:
+        return extract_review(html, extractor)
+    except (AttributeError, IndexError, KeyError, TypeError) as e:
+        raise ParseError(f'Could not find the review details on {review_url}') from e
+
+
+def extract_review(html, extractor, parse_only=None):
+    """Function that parses a review page and extracts its details
+
+    Args:
+        html (string): The review page
+        extractor (ReviewExtractor): Extractor of the review site
+        parse_only (SoupStrainer, optional): Limits parsing to the elements the site needs
+
+    Returns:
+        dict: Title, author, date, rating and domain of the review
+    """
+
+    # bs4 is imported here, so only the code paths that scrape reviews pay for it
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, get_html_parser(), parse_only=parse_only)
+
+    try:
+        # Structured data first, the site specific DOM extractors fill in whatever is missing
+        structured = get_structured_review(soup)
+        rating = get_structured_rating(structured, extractor)
+
+        review = {
+            "title": structured.get('title') or extractor.title(soup),
+            "author": get_author(structured, extractor, soup),
+            "date": (convert_date(structured['date']) if structured.get('date')
+                     else extractor.date(soup)),
+            "rating": rating if rating else extractor.rating(soup),
+            "domain": extractor.domain
+        }
+    finally:
+        # Free the tree right away instead of waiting for the garbage collector
+        soup.decompose()
+
+    return review
+
+
+def get_author(structured, extractor, soup):
+    """Helper function to pick the author, preferring the structured one
+
+    The structured author is only used if the site's format can be applied to it,
+    otherwise the byline on the page is read instead.
+
+    Args:
+        structured (dict): Result of get_structured_review
+        extractor (ReviewExtractor): Extractor of the review site
+        soup (BeautifulSoup): The parsed page
+
+    Returns:
+        string: The formatted author
+    """
+
+    if structured.get('author'):
+        try:
+            return extractor.format_author(structured['author'])
+        except IndexError:
+            pass
+
+    return extractor.format_author(extractor.author(soup))
+
+
+def iter_json_ld(text):
+    """Helper function to go through the objects of a JSON-LD script
+
+    Args:
+        text (string): Contents of the script tag
+
+    Yields:
+        dict: Every object, including the ones inside @graph
+    """
+
+    try:
+        data = json.loads(text or '')
+    except ValueError:
+        return
+
+    stack = data if isinstance(data, list) else [data]
+    while stack:
+        item = stack.pop(0)
+        if not isinstance(item, dict):
+            continue
+        yield item
+        stack.extend(item.get('@graph', []))
+
+
+def get_json_ld_name(value):
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('name')
+    return value.strip() if isinstance(value, str) else None
+
+
+def get_structured_review(soup):
+    """Function that reads the review details from JSON-LD and OpenGraph data
+
+    Goes through the script and meta tags once. Whatever the page doesn't publish is
+    left out of the result.
+
+    Args:
+        soup (BeautifulSoup): The parsed page
+
+    Returns:
+        dict: Any of title, author, date (ISO format), rating and best_rating
+    """
+
+    fields = {}
+
+    for tag in soup.find_all(['script', 'meta']):
+        if tag.name == 'meta':
+            prop = tag.get('property') or tag.get('name')
+            if prop == 'article:published_time' and get_iso_date(tag.get('content')):
+                fields.setdefault('date', get_iso_date(tag['content']))
+            continue
+
+        if tag.get('type') != 'application/ld+json':
+            continue
+
+        for item in iter_json_ld(tag.string):
+            types = item.get('@type')
+            types = types if isinstance(types, list) else [types]
+
+            if 'Review' in types:
+                reviewed = item.get('itemReviewed') or {}
+                album = get_json_ld_name(reviewed)
+                artist = get_json_ld_name(reviewed.get('byArtist')) if isinstance(
+                    reviewed, dict) else None
+                if album and artist:
+                    fields.setdefault('title', f'{artist} - {album}')
+
+                # Organisations (ie. the site itself) aren't a byline
+                author = item.get('author')
+                author = author[0] if isinstance(author, list) and author else author
+                if isinstance(author, dict) and author.get('@type') == 'Person':
+                    name = get_json_ld_name(author)
+                    if name:
+                        fields.setdefault('author', name)
+
+                rating = item.get('reviewRating') or {}
+                if isinstance(rating, dict) and rating.get('ratingValue') is not None:
+                    fields.setdefault('rating', rating['ratingValue'])
+                    fields.setdefault('best_rating', rating.get('bestRating'))
+
+            published = get_iso_date(item.get('datePublished'))
+            if published:
+                fields.setdefault('date', published)
+
+    return fields
+
+
+def get_iso_date(value):
+    """Helper function to read the date part of an ISO timestamp
+
+    Args:
+        value (string): Timestamp, ie. '2024-01-31T12:00:00+02:00'
+
+    Returns:
+        string: The date, ie. '2024-01-31', None if the value isn't an ISO date
+    """
+
+    if not isinstance(value, str):
         return None
-    rating = f"* [[{site}]]: {{{{Arvostelutähdet|{review['rating']}|{max_rating}}}}}"
-    return rating
 
+    try:
+        return date.fromisoformat(value.split('T')[0].strip()).isoformat()
+    except ValueError:
+        return None
+
+
+def get_structured_rating(structured, extractor):
+    """Helper function to pick the structured rating if it's on the same scale we use
+
+    Args:
+        structured (dict): Result of get_structured_review
+        extractor (ReviewExtractor): Extractor of the review site
+
+    Returns:
+        string: The rating, None if it's missing or on a different scale
+    """
 
-def get_review_title(soup, domain):
-    if domain == 'kaaoszine.fi':
-        title = soup.find(class_='article-title').get_text()
-    elif domain == 'www.soundi.fi':
-        title = soup.find('h1').get_text()
-    elif domain == 'metalliluola.fi':
-        title = soup.find('h1').get_text()
-    elif domain == 'blabbermouth.net':
-        artist = soup.find(
-            'h1', class_='margin__top-default margin__bottom-default').get_text()
-        album = soup.find('h2', class_='margin__bottom-default').get_text()
-        title = artist + ' - ' + album
-    elif domain == 'metalinjection.net':
-        title = soup.find('h1').get_text()
-    elif domain == 'www.metalsucks.net':
-        title = soup.find('h1').get_text()
-    elif domain == 'www.inferno.fi':
-        title = soup.find('h1').get_text()
-    elif domain == 'www.angrymetalguy.com':
-        title = soup.find('title').get_text()
-        title = title.split('Review')[0].strip()
-    elif domain == 'distortedsoundmag.com':
-        title = ' - '.join([item.strip().title() for item in soup.find('title').get_text().split('-')[:2]])
-    elif domain == 'www.loudersound.com':
-        title = soup.find('title').get_text().split('|')[0]
-
-    return title
-
-
-def get_review_author(soup, domain):
-    if domain == 'kaaoszine.fi':
-        author_and_date_div = soup.find('div', class_='author-and-date')
-        author = author_and_date_div.find('strong').get_text()
-    elif domain == 'www.soundi.fi':
-        date_and_author = soup.find_all('div', class_='text-gray-400')
-        author = date_and_author[1].get_text().split(':')[1].strip()[:-1]
-    elif domain == 'metalliluola.fi':
-        author_div = soup.find('div', class_='td-post-author-name')
-        author = author_div.a.get_text()
-    elif domain == 'blabbermouth.net':
-        author_div = soup.find('div', class_='news-relative-items').find('div')
-        author = author_div.get_text(strip=True).replace('Author:', '')
-    elif domain == 'metalinjection.net':
-        author_span = soup.find('span', class_='zox-author-name')
-        author = author_span.find('a').get_text()
-    elif domain == 'www.metalsucks.net':
-        author = soup.find('span', class_='author').find('a').get_text()
-    elif domain == 'www.inferno.fi':
-        author = soup.find('a', {'rel': 'author'}).get_text()
-    elif domain == 'www.angrymetalguy.com':
-        author = soup.find('span', class_='uppercase authorname').get_text()
-        author = author.title()
-    elif domain == 'distortedsoundmag.com':
-        author_span = soup.find('span', class_='cm-author cm-vcard')
-        author = author_span.find('a').get_text()
-    elif domain == 'www.loudersound.com':
-        author_span = soup.find('span', class_='author-byline__author-name')
-        author = author_span.find('a').get_text()
-
-    # If "real" name, try to split is so we can have it in Lastname, Firstname format
-    if domain != 'www.angrymetalguy.com':
-        split = author.split()
-        author = f"{split[1]}, {split[0]}"
-
-    return author
-
-
-def get_review_date(soup, domain):
-    if domain == 'www.inferno.fi':
-        date = soup.find('div', class_='pr-2 pl-1 text-gray-400').get_text()
-    else:
-        meta_tag = soup.find('meta', property='article:published_time')
-        dt = meta_tag['content']
-        dt = dt.split('T')[0]
-        date = convert_date(dt)
-
-    return date
-
-
-def get_review_rating(soup, domain):
-    if domain == 'kaaoszine.fi':
-        rating_div = soup.find(class_='rating')
-        one_count = len(rating_div.find_all(class_='one'))
-        half_count = len(rating_div.find_all(class_='half'))
-        rating = one_count + 0.5 * half_count
-    elif domain == 'www.soundi.fi':
-        div = soup.find('div', class_='pb-2 flex pt-2 justify-center')
-        ratings = div.find_all('li')
-        rating = len(ratings)
-    elif domain == 'metalliluola.fi':
-        rating = soup.find('h3').get_text()
-        rating = rating.split('/')[0].strip()
-    elif domain == 'blabbermouth.net':
-        rating_div = soup.find('div', class_='reviews-rate-comments')
-        rating = rating_div.find('div').get_text().split(
-            '/')[0].strip() if rating_div else None
-    elif domain == 'metalinjection.net':
-        rating_span = soup.find(
-            'span', class_='rwp-overlall-score-value')
-        rating = rating_span.get_text() if rating_span else None
-    elif domain == 'www.metalsucks.net':
-        img_tag = soup.find('div', class_='rating').find('img')
-        src_value = img_tag['src']
-        rating = src_value.split('/')[-1].split('.')[0].split('-')[1]
-        if rating[1] == 5:
-            rating = int(rating) / 10
-        else:
-            rating = int(int(rating) / 10)
-    elif domain == 'www.inferno.fi':
-        img_tag = soup.find('div', class_='review-rating').find('img')
-        lazy_src_url = img_tag['data-lazy-src']
-        rating = lazy_src_url.split('/')[-1].split('.')[0]
-        if '-' in rating:
-            rating = rating.replace('-', '.')
-    elif domain == 'www.angrymetalguy.com':
-        rating_text = soup.find('strong', string=re.compile('^Rating'))
-        rating = rating_text.next_sibling.strip()
-
-        if rating[0] == ':':
-            rating = rating.split(':')[1].split('/')[0].strip()
-        else:
-            rating = rating.split('/')[0].strip()
-    elif domain == 'distortedsoundmag.com':
-        rating_b = soup.find('b', string=re.compile('^Rating'))
-
-        if rating_b:
-            rating = rating_b.next_sibling.get_text().split('/')[0]
-        else:
-            rating = soup.find('strong', string=re.compile('^Rating')).get_text().split()[1].split('/')[0]
-    elif domain == 'www.loudersound.com':
-        rating_span = soup.find('span', class_='chunk rating')
-        rating = rating_span.get('aria-label')
-        rating = re.findall(r'\d+', rating)[0]
+    try:
+        rating = float(structured['rating'])
+        best_rating = float(structured['best_rating'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if best_rating != extractor.max_rating:
+        return None
+
+    return f'{rating:g}'
 
+
+def create_album_rating(review):
+    extractor = get_extractor(review['domain'])
+
+    if not review['rating']:
+        return None
+    rating = f"* [[{extractor.site}]]: {{{{Arvostelutähdet|{review['rating']}|{extractor.max_rating}}}}}"
     return rating
 
 
@@ -223,10 +443,8 @@ def create_reference(review):
     # Remove leading zeros from day and month
     current_date = current_date.replace('.0', '.').lstrip('0')
     domain = review['domain']
-    english = ['blabbermouth.net', 'metalinjection.net', 'www.metalsucks.net',
-               'www.angrymetalguy.com', 'distortedsoundmag.com', 'www.loudersound.com']
 
-    language = " | Kieli = {{en}}" if domain in english else ""
+    language = " | Kieli = {{en}}" if get_extractor(domain).language == 'en' else ""
     date = f"Ajankohta = {review['date']}"
 
     reference = (f"<ref>{{{{Verkkoviite | Osoite = {review['url']} | Nimeke = {review['title']}"
@@ -236,18 +454,85 @@ def create_reference(review):
     return reference
 
 
-def convert_date(date):
-    if platform.system() == 'Windows':
-        return datetime.strptime(date, '%Y-%m-%d').strftime('%#d.%#m.%Y')
-    return datetime.strptime(date, '%Y-%m-%d').strftime('%-d.%-m.%Y')
+def scrape_reviews(review_urls, workers=c.REVIEW_WORKERS):
+    """Function that scrapes many reviews concurrently and yields them as they complete
+
+    Args:
+        review_urls (list): Links to the reviews
+        workers (int): Number of reviews fetched at the same time
+
+    Yields:
+        dict: Link, status, running time, review, error and exit code of one review. The
+       exit code is 0 for reviews that were scraped, the exit_code of the error for
+       typed failures and 1 otherwise
+    """
+
+    def scrape(review_url):
+        start = time.perf_counter()
+        result = {"url": review_url, "status": "ok", "review": None, "error": None,
+                  "exit_code": 0}
+
+        try:
+            if get_extractor(get_domain(review_url)) is None:
+                result.update(status="unsupported", exit_code=1)
+            else:
+                result['review'] = get_review(review_url)
+                if result['review'] is None:
+                    result.update(status="incomplete", exit_code=1)
+        except WaferError as e:
+            result.update(status="error", error=str(e), exit_code=e.exit_code)
+        except Exception as e:
+            # One broken page shouldn't stop the rest
+            result.update(status="error", error=repr(e), exit_code=1)
+
+        result['seconds'] = round(time.perf_counter() - start, 3)
+
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(scrape, review_url) for review_url in review_urls]
+
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape reviews into wiki ratings and references')
+    parser.add_argument('urls', nargs='*',
+                        help="Links to the reviews, read from stdin if none are given or '-'")
+    parser.add_argument('--format', choices=('wiki', 'jsonl'), default='wiki',
+                        help='wiki prints the references and the status to stderr, jsonl '
+                        'prints one result per line')
+    parser.add_argument('--workers', type=int, default=c.REVIEW_WORKERS,
+                        help='Number of reviews fetched at the same time')
+
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
 
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <review_url>")
-        sys.exit(1)
+    args = parse_arguments()
+
+    urls = [url for url in args.urls if url != '-']
+    if not urls or '-' in args.urls:
+        urls += [line.strip() for line in sys.stdin if line.strip()]
+
+    # The same review pasted twice only needs to be fetched once
+    urls = list(dict.fromkeys(urls))
+
+    # Exit with the code of the first failure, like a single review would
+    exit_code = 0
+
+    for result in scrape_reviews(urls, args.workers):
+        exit_code = exit_code or result['exit_code']
+
+        if args.format == 'jsonl':
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+            continue
 
-    url = sys.argv[1]
+        if result['review']:
+            print(result['review'], flush=True)
+        print(f"[{result['status']}] {result['url']} ({result['seconds']} s)"
+              + (f": {result['error']}" if result['error'] else ''), file=sys.stderr)
 
-    print(get_review(url))
+    sys.exit(exit_code)
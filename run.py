@@ -1,46 +1,207 @@
 """Main module to be run
 """
 
-import time
+import asyncio
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import constants as c
+from errors import WaferError
 
 from helpers import fill_album_info_box, fill_tracklist, fill_lineup, get_reviews, add_reviews, add_external_links, add_references, export_wiki_template, add_stub, add_classes
+from helpers import construct_path, get_album_id, get_release_information, get_neighbour_albums, get_tracklist, fetch_reviews
+from helpers import create_album_data, find_neighbour_albums, get_all_artist_albums
 
 
-def run(album_info):
+def run(album_info, save=True, directory='./albums/'):
     """Main function to be run
 
     Args:
-        link (string): Tidal album link, for example: 'https://tidal.com/browse/album/102314585'
+        album_info (dict): Album information from the form, with the Tidal album link,
+       for example: 'https://tidal.com/browse/album/102314585'
+        save (bool): Whether to also write the template to the albums directory
+        directory (string, optional): Directory the template is written to
+
+    Returns:
+        string: The generated wiki template
+    """
+
+    doc, album = fill_album_info_box(album_info)
+
+    return write_page(album_info, doc, album, save=save, directory=directory)
+
+
+async def run_async(album_info, save=True, directory='./albums/'):
+    """Async variant of run that fetches independent data at the same time
+
+    The tracklist and the reviews don't depend on the album information, so only the
+    previous and next album have to wait for the album fetch.
+
+    Args:
+        album_info (dict): Album information from the form
+        save (bool): Whether to also write the template to the albums directory
+        directory (string, optional): Directory the template is written to
+
+    Returns:
+        tuple: The generated wiki template and the links to the reviews that missed the
+       deadline
+    """
+
+    review_list = get_reviews(album_info['reviews']) if album_info['reviews'] else []
+
+    # Each step maps to the function to run and the steps whose results it takes as arguments
+    steps = {
+        'album': (partial(get_release_information, get_album_id(album_info['link'])), []),
+        'neighbours': (get_neighbour_albums, ['album']),
+        'tracklist': (partial(get_tracklist, get_album_id(album_info['link'])), []),
+        'reviews': (partial(fetch_reviews, review_list), []),
+    }
+
+    results = await run_steps(steps)
+
+    doc, album = fill_album_info_box(
+        album_info, results['album'], results['neighbours'])
+
+    reviews, missing_reviews = results['reviews']
+
+    wiki_template = write_page(album_info, doc, album, results['tracklist'], reviews, save,
+                               directory)
+
+    return wiki_template, missing_reviews
+
+
+def run_discography(artist_id, album_info, save=True, directory='./albums/'):
+    """Function that generates the pages of every album of an artist in one pass
+
+    The album data and the previous and next albums all come from a single discography
+    fetch, so on top of it only the tracklists are requested, one album at a time per
+    worker. Reviews and external links are album specific, so they are left out.
+
+    Args:
+        artist_id (string): Tidal ID of the artist
+        album_info (dict): Album information shared by every page, ie. members and classes
+        save (bool): Whether to also write the templates to the albums directory
+        directory (string, optional): Directory the templates are written to
+
+    Returns:
+        dict: Album IDs mapped to the generated wiki templates, albums that failed are
+       left out
     """
 
-    file, album = fill_album_info_box(album_info)
+    all_albums = get_all_artist_albums(artist_id)
 
-    # Sleep for a second so we don't hammer the API too often
-    time.sleep(1)
+    albums = []
+    for album in all_albums.albums:
+        if album['duration'] is None or album['artist_name'] is None:
+            # Rows the API returned incomplete still need the album endpoint
+            try:
+                album_data = get_release_information(album['album_id'])
+            except WaferError as e:
+                print(f"Error: could not fetch {album['title']}: {e}")
+                continue
+        else:
+            album_data = create_album_data(
+                album['album_id'], album['title'], album['release_date'],
+                album['artist_name'], artist_id, album['duration'])
+        albums.append(album_data)
 
-    fill_tracklist(album_info['link'], file, album)
+    workers = max(1, min(c.TRACKS_WORKERS, len(albums)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(get_tracklist, album['album_id']) for album in albums]
 
-    fill_lineup(file, album_info['members'])
+    templates = {}
+
+    for album_data, future in zip(albums, futures):
+        # The form helpers modify the lists in album_info, so every page gets its own copy
+        page_info = copy.deepcopy(album_info)
+        page_info.update(link=f"https://tidal.com/browse/album/{album_data['album_id']}",
+                         reviews=[], external_links=[])
+
+        try:
+            doc, album = fill_album_info_box(
+                page_info, album_data, find_neighbour_albums(all_albums, album_data))
+            templates[album_data['album_id']] = write_page(
+                page_info, doc, album, future.result(), save=save, directory=directory)
+        except WaferError as e:
+            print(f"Error: could not generate {album_data['album_title']}: {e}")
+
+    return templates
+
+
+async def run_steps(steps):
+    """Function that runs a dependency graph of blocking steps in worker threads
+
+    Every step starts as soon as the steps it depends on have finished.
+
+    Args:
+        steps (dict): Step names mapped to a (function, dependencies) tuple
+
+    Returns:
+        dict: Step names mapped to their results
+    """
+
+    tasks = {}
+
+    async def run_step(name):
+        func, dependencies = steps[name]
+        args = [await tasks[dependency] for dependency in dependencies]
+        return await asyncio.to_thread(func, *args)
+
+    # The tasks only start running once we yield to the event loop, so every
+    # dependency exists in tasks by the time it's awaited
+    for name in steps:
+        tasks[name] = asyncio.create_task(run_step(name))
+
+    results = await asyncio.gather(*tasks.values())
+
+    return dict(zip(tasks, results))
+
+
+def write_page(album_info, doc, album, tracklist=None, reviews=None, save=True,
+               directory='./albums/'):
+    """Function that writes everything after the info box to the document
+
+    Args:
+        album_info (dict): Album information from the form
+        doc (WikiDocument): Document started by fill_album_info_box
+        album (dict): Album data
+        tracklist (list, optional): Already fetched tracklist
+        reviews (list, optional): Already fetched reviews
+        save (bool): Whether to also write the template to the albums directory
+        directory (string, optional): Directory the template is written to
+
+    Returns:
+        string: The generated wiki template
+    """
+
+    fill_tracklist(album_info['link'], doc, album, tracklist)
+
+    fill_lineup(doc, album_info['members'])
 
     if album_info['reviews']:
         review_list = get_reviews(album_info['reviews'])
 
-        add_reviews(review_list, file)
+        # Only the plain run fetches here, run_async reports the late reviews itself
+        for review in add_reviews(review_list, doc, reviews):
+            print(f'Error: review {review} did not arrive in time')
 
     # Delete entries without URL's before attempting to add the links
     for i in range(len(album_info['external_links']) - 1, -1, -1):
         if not album_info['external_links'][i]['url']:
             del album_info['external_links'][i]
 
-    add_references(file)
+    add_references(doc)
 
-    add_external_links(album_info['external_links'], file, album)
+    add_external_links(album_info['external_links'], doc, album)
 
     if album_info['stub']:
-        add_stub(file)
+        add_stub(doc)
+
+    add_classes(doc, album_info['classes'])
 
-    add_classes(file, album_info['classes'])
+    path = construct_path(album['artist'], album['album_title'], directory) if save else None
 
-    wiki_template = export_wiki_template(file)
+    wiki_template = export_wiki_template(doc, path)
 
     return wiki_template
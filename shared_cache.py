@@ -0,0 +1,87 @@
+"""Module that hosts the process-wide lookup caches
+
+The caches are module singletons, so every thread, batch worker and Streamlit session
+served by the same process shares them. Streamlit only reruns app.py, the imported
+modules (and these caches with them) stay loaded between reruns and sessions.
+"""
+
+import threading
+from concurrent.futures import Future
+
+from cachetools import TTLCache
+
+import constants as c
+
+
+class SharedCache:
+    """Thread safe TTL cache that coalesces concurrent lookups of the same key
+
+    While a key is being fetched, other callers asking for it wait for that fetch
+    instead of starting their own. Failed fetches are not cached, every waiter gets
+    the error and the next lookup tries again. The cached values are shared between
+    callers, so they must not be modified.
+
+    Args:
+        maxsize (int): Number of entries kept, the least recently used go first
+        ttl (float): Seconds an entry is kept
+    """
+
+    def __init__(self, maxsize, ttl) -> None:
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def get_or_fetch(self, key, fetch, keep=None):
+        """Function that returns the cached value of a key, fetching it if needed
+
+        Args:
+            key (hashable): Key of the value
+            fetch (callable): Called without arguments to fetch the value
+            keep (callable, optional): Called with the fetched value, the value is only
+               cached if it returns True. Waiting callers get the value either way
+
+        Returns:
+            The value
+        """
+
+        with self.lock:
+            value = self.cache.get(key, self)
+            if value is not self:
+                return value
+
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            if keep is None or keep(value):
+                self.cache[key] = value
+            del self.in_flight[key]
+        future.set_result(value)
+
+        return value
+
+
+# Album data keyed by Tidal album ID
+albums = SharedCache(c.ALBUM_CACHE_SIZE, c.ALBUM_CACHE_TTL)
+
+# Tracklists keyed by Tidal album ID
+tracklists = SharedCache(c.TRACKLIST_CACHE_SIZE, c.TRACKLIST_CACHE_TTL)
+
+# Artist discographies keyed by Tidal artist ID
+discographies = SharedCache(c.DISCOGRAPHY_CACHE_SIZE, c.DISCOGRAPHY_CACHE_TTL)
+
+# Extracted review records keyed by normalised URL
+reviews = SharedCache(c.REVIEW_MEMORY_CACHE_SIZE, c.REVIEW_MEMORY_CACHE_TTL)
@@ -0,0 +1,88 @@
+"""Module that hosts the shared user agent provider
+"""
+
+import random
+import threading
+
+import constants as c
+
+# Used if fake_useragent is not available or its data can't be loaded
+BUNDLED_USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/17.2.1 Safari/605.1.15',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/121.0.0.0 Safari/537.36 Edg/121.0.0.0',
+]
+
+
+class UserAgentProvider:
+    """Thread safe source of user agents
+
+    The fake_useragent data is loaded once, on first use, and shared by every thread.
+
+    Args:
+        sticky (bool): Whether each domain keeps the user agent it got first
+    """
+
+    def __init__(self, sticky=False) -> None:
+        self.sticky = sticky
+        self.lock = threading.Lock()
+        self.user_agent = None
+        self.loaded = False
+        self.by_domain = {}
+
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            try:
+                from fake_useragent import UserAgent
+                self.user_agent = UserAgent()
+            except Exception:
+                self.user_agent = None
+            self.loaded = True
+
+    def random(self):
+        if not self.loaded:
+            self.load()
+
+        if self.user_agent is not None:
+            try:
+                return self.user_agent.random
+            except Exception:
+                pass
+
+        return random.choice(BUNDLED_USER_AGENTS)
+
+    def get(self, domain=None):
+        """Function that returns a user agent for a request
+
+        Args:
+            domain (string, optional): Domain the request goes to
+
+        Returns:
+            string: The user agent
+        """
+
+        if not self.sticky or domain is None:
+            return self.random()
+
+        user_agent = self.by_domain.get(domain)
+        if user_agent is None:
+            user_agent = self.by_domain.setdefault(domain, self.random())
+
+        return user_agent
+
+
+provider = UserAgentProvider(c.STICKY_USER_AGENT)
+
+
+def get_user_agent(domain=None):
+    return provider.get(domain)